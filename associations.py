@@ -1,5 +1,4 @@
 # associations.py
-import pandas as pd
 import numpy as np
 from stat_corr_types import TStatCorr
 
@@ -14,86 +13,96 @@ def build_associations(stat_corr: TStatCorr, params: dict):
         return []
 
     # Матрица R (симметричная, положительные только)
-    corr_matrix = pd.DataFrame(np.zeros((num_features, num_features)), dtype=float)
-    for i in range(stat_corr.count()):
-        pair = stat_corr.get_pair(i)
-        r = stat_corr.get_corr(i)
-        if np.isnan(r):
-            r = 0.0
-        r = max(r, 0.0)  # Только положительные
-        corr_matrix.at[pair.col1, pair.col2] = r
-        corr_matrix.at[pair.col2, pair.col1] = r
-    np.fill_diagonal(corr_matrix.values, 1.0)
-
-    # Доступные фичи
-    available = set(range(num_features))
+    cols1, cols2, r = stat_corr.get_pairs_array()
+    r = np.maximum(np.nan_to_num(r, nan=0.0), 0.0)  # Только положительные, NaN → 0
+    corr_matrix = np.zeros((num_features, num_features), dtype=np.float32)
+    corr_matrix[cols1, cols2] = r
+    corr_matrix[cols2, cols1] = r
+    np.fill_diagonal(corr_matrix, 1.0)
+    row_means = corr_matrix.mean(axis=1, dtype=np.float64)  # матрица дальше не меняется
+
+    # Пороги в точности матрицы: R, равный порогу, проходит так же, как во float64
+    threshold_root = np.float32(params['threshold_root'])
+    threshold_avg = np.float32(params['threshold_avg'])
+
+    # Доступные фичи (маска)
+    available = np.ones(num_features, dtype=bool)
     clusters = []
     iter_count = 0
-    while available and iter_count < params['max_iters']:
+    while available.any() and iter_count < params['max_iters']:
         iter_count += 1
         moved = 0
 
         # Фаза 1: Новые кластеры из available
-        while available:
-            # Найти max пару в available
-            max_r = -1
-            best_pair = None
-            for a in list(available):
-                for b in list(available):
-                    if a < b and corr_matrix.at[a, b] > max_r and corr_matrix.at[a, b] >= params['threshold_root']:
-                        max_r = corr_matrix.at[a, b]
-                        best_pair = (a, b)
-            if best_pair is None:
+        while available.any():
+            # Найти max пару в available (верхний треугольник подматрицы)
+            avail_idx = np.flatnonzero(available)
+            iu_a, iu_b = np.triu_indices(len(avail_idx), k=1)
+            pair_rs = corr_matrix[avail_idx[iu_a], avail_idx[iu_b]]
+            pair_rs = np.where(pair_rs >= threshold_root, pair_rs, -np.inf)
+            if pair_rs.size == 0 or np.isneginf(pair_rs.max()):
                 break  # Нет сильных пар
 
-            a, b = best_pair
+            k = int(pair_rs.argmax())
+            a, b = int(avail_idx[iu_a[k]]), int(avail_idx[iu_b[k]])
             # Выбрать root: тот с выше средней R ко всем
-            mean_a = corr_matrix.iloc[a].mean()
-            mean_b = corr_matrix.iloc[b].mean()
-            root = a if mean_a > mean_b else b
+            root = a if row_means[a] > row_means[b] else b
             current_cluster = [a, b] if root == a else [b, a]
 
             # Добавление кандидатов
-            candidates = sorted(available - set(current_cluster),
-                                key=lambda c: corr_matrix.at[c, root], reverse=True)
-            for cand in candidates:
-                r_root = corr_matrix.at[cand, root]
-                avg_cluster = corr_matrix.loc[cand, current_cluster].mean()
-                if r_root >= params['threshold_root'] and avg_cluster >= params['threshold_avg']:
+            rest = avail_idx[(avail_idx != a) & (avail_idx != b)]
+            candidates = rest[np.argsort(-corr_matrix[rest, root], kind='stable')]
+            # Суммы R кандидатов до членов кластера, пополняются при добавлении
+            cluster_sums = corr_matrix[candidates, a].astype(np.float64) + corr_matrix[candidates, b]
+            for k, cand in enumerate(candidates.tolist()):
+                r_root = corr_matrix[cand, root]
+                avg_cluster = cluster_sums[k] / len(current_cluster)
+                if r_root >= threshold_root and avg_cluster >= threshold_avg:
                     current_cluster.append(cand)
+                    cluster_sums[k + 1:] += corr_matrix[candidates[k + 1:], cand]
 
             # Добавить кластер
             clusters.append({'features': sorted(current_cluster), 'root': root})
-            available -= set(current_cluster)
+            available[current_cluster] = False
 
         # Фаза 2: Перераспределение weak
         weak_features = []
         for cl in clusters:
             root = cl['root']
-            weak = [f for f in cl['features'] if f != root and corr_matrix.at[f, root] < params['threshold_root']]
+            weak = [f for f in cl['features'] if f != root and corr_matrix[f, root] < threshold_root]
             weak_features.extend(weak)
             cl['features'] = [f for f in cl['features'] if f not in weak]  # Удалить weak
 
         # Добавить weak в available
-        available.update(weak_features)
+        available[weak_features] = True
 
         # Переместить weak/free в лучшие кластеры
-        for f in list(available):
-            current_r = 0.0  # Для free
-            best_cl = None
-            best_potential_r = -1
-            for cl_idx, cl in enumerate(clusters):
-                if len(cl['features']) == 0:
+        free_idx = np.flatnonzero(available)
+        if free_idx.size and clusters:
+            roots = np.array([cl['root'] for cl in clusters])
+            sizes = np.array([len(cl['features']) for cl in clusters])
+            filled = sizes > 0
+            # R до корня и сумма R до членов: свободные признаки × кластеры
+            potential = corr_matrix[np.ix_(free_idx, roots)]
+            members = np.concatenate([np.asarray(cl['features'], dtype=int) for cl in clusters])
+            sums = np.zeros((free_idx.size, len(clusters)))
+            sums[:, filled] = np.add.reduceat(corr_matrix[np.ix_(free_idx, members)], (np.cumsum(sizes) - sizes)[filled],
+                                              axis=1, dtype=np.float64)
+
+            for i, f in enumerate(free_idx.tolist()):
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    avg_cl = sums[i] / sizes
+                fits = (filled & (potential[i] > 0.0) & (potential[i] >= threshold_root) &
+                        (avg_cl >= threshold_avg))
+                if not fits.any():
                     continue
-                potential_r = corr_matrix.at[f, cl['root']]
-                avg_cl = corr_matrix.loc[f, cl['features']].mean()
-                if (potential_r > best_potential_r and potential_r > current_r and
-                    potential_r >= params['threshold_root'] and avg_cl >= params['threshold_avg']):
-                    best_potential_r = potential_r
-                    best_cl = cl_idx
-            if best_cl is not None:
+                best_cl = int(np.argmax(np.where(fits, potential[i], -np.inf)))
                 clusters[best_cl]['features'].append(f)
-                available.remove(f)
+                # Средние остальных свободных признаков учитывают нового члена
+                sizes[best_cl] += 1
+                filled[best_cl] = True
+                sums[:, best_cl] += corr_matrix[free_idx, f]
+                available[f] = False
                 moved += 1
 
         # Проверка сходимости
@@ -101,23 +110,24 @@ def build_associations(stat_corr: TStatCorr, params: dict):
             break
 
     # Постобработка: одиночные + averages
-    for f in available:
+    for f in np.flatnonzero(available).tolist():
         clusters.append({'features': [f], 'root': f})
 
     for cl in clusters:
         feats = cl['features']
+        external_mask = np.ones(num_features, dtype=bool)
+        external_mask[feats] = False
         if len(feats) == 1:
             cl['internal_avg_r'] = 1.0
-            external_mask = ~corr_matrix.index.isin(feats)
-            cl['external_avg_r'] = corr_matrix.loc[feats[0], external_mask].mean()
+            cl['external_avg_r'] = float(corr_matrix[feats[0], external_mask].mean(dtype=np.float64))
         else:
             # Internal: mean верхнего треугольника
-            internal_rs = [corr_matrix.at[i, j] for i in feats for j in feats if i < j]
-            cl['internal_avg_r'] = np.mean(internal_rs) if internal_rs else 0.0
+            iu_a, iu_b = np.triu_indices(len(feats), k=1)
+            feats_arr = np.asarray(feats)
+            cl['internal_avg_r'] = float(corr_matrix[feats_arr[iu_a], feats_arr[iu_b]].mean(dtype=np.float64))
             # External: mean с остальными
-            external_mask = ~corr_matrix.index.isin(feats)
-            external_avg = corr_matrix.loc[feats, external_mask].values.flatten().mean()
-            cl['external_avg_r'] = external_avg if not np.isnan(external_avg) else 0.0
+            external_avg = corr_matrix[np.ix_(feats, external_mask)].mean(dtype=np.float64)
+            cl['external_avg_r'] = float(external_avg) if not np.isnan(external_avg) else 0.0
 
     # Сортировка: по размеру desc, затем internal_avg_r desc
     clusters.sort(key=lambda c: (-len(c['features']), -c['internal_avg_r']))
@@ -5,64 +5,137 @@
 """
 
 import numpy as np
-from scipy.stats import spearmanr
+from scipy.stats import rankdata
 from stat_corr_types import TStatCorr, TColumnPair
 
-def rank_array(values):
+def spearman_matrix(X, ranks=None):
     """
-    Ранжирование массива с обработкой связок (средний ранг).
-    Порог сравнения 1e-9 для учёта погрешности float (как в оригинале Delphi).
+    Матрица корреляций Спирмена для всех столбцов X (записи × признаки).
+    Каждый столбец ранжируется один раз, далее — Пирсон на рангах (без p-value).
+    Среднее рангов известно заранее — (n+1)/2, в том числе при связках, поэтому
+    центрирование и ковариация считаются одним matmul; без связок знаменатель
+    равен n(n²−1)/12, что даёт классическое 1 − 6Σd²/(n(n²−1)).
+    Столбцы с NaN дают NaN — такие пары считаются отдельно.
+    ranks — готовые ранги столбцов X (rankdata по axis=0), если уже посчитаны.
     """
-    values = np.asarray(values)
-    n = len(values)
-    if n == 0:
-        return np.array([])
+    num_records = X.shape[0]
+    if ranks is None:
+        ranks = rankdata(X, axis=0)
+    ranks = np.asarray(ranks, dtype=np.float64) - (num_records + 1) / 2.0  # ранги могут храниться во float32
+    sum_sq = np.einsum('ij,ij->j', ranks, ranks)
+    no_ties_sum_sq = num_records * (num_records ** 2 - 1) / 12.0
+    if np.all(sum_sq == no_ties_sum_sq):
+        # Связок нет ни в одном столбце (связки строго уменьшают Σ(rank−mean)², сумма
+        # кратна 0.25 и считается точно) — знаменатель один на все пары
+        corr = (ranks.T @ ranks) / no_ties_sum_sq
+    else:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            corr = (ranks.T @ ranks) / np.sqrt(np.outer(sum_sq, sum_sq))
+    return np.clip(corr, -1.0, 1.0)
 
-    indices = np.argsort(values)
-    ranks = np.empty(n, dtype=float)
 
-    i = 0
-    while i < n:
-        j = i
-        while j < n - 1 and abs(values[indices[j]] - values[indices[j + 1]]) < 1e-9:
-            j += 1
-        temp_rank = (i + j + 2) / 2.0  # ранги начинаются с 1
-        for k in range(i, j + 1):
-            ranks[indices[k]] = temp_rank
-        i = j + 1
+def spearman_pair(a, b, nan_policy='propagate'):
+    """
+    Корреляция Спирмена двух векторов — только коэффициент, без p-value spearmanr.
+    nan_policy как у spearmanr: 'propagate' — NaN в данных даёт NaN,
+    'omit' — записи с NaN в любом из векторов исключаются попарно.
+    Постоянный вектор даёт NaN; если постоянным он стал после исключения
+    пропусков — 0.0, как в spearmanr.
+    """
+    a = np.asarray(a, dtype=float)
+    b = np.asarray(b, dtype=float)
+    if a.size < 2 or (a[0] == a).all() or (b[0] == b).all():
+        return np.nan
+    missing = np.isnan(a) | np.isnan(b)
+    if missing.any():
+        if nan_policy != 'omit':
+            return np.nan
+        a, b = a[~missing], b[~missing]
+        if a.size < 2:
+            return np.nan
 
-    return ranks
+    mean_rank = (a.size + 1) / 2.0
+    ranks_a = rankdata(a) - mean_rank
+    ranks_b = rankdata(b) - mean_rank
+    denominator = np.sqrt((ranks_a @ ranks_a) * (ranks_b @ ranks_b))
+    if denominator == 0.0:
+        return 0.0
+    return float(np.clip((ranks_a @ ranks_b) / denominator, -1.0, 1.0))
 
 
-def join_percent(stat_corr, col_a, col_b, get_data, num_records, percent):
+def intersection_counts(mask):
     """
-    Коэффициент пересечения топ-% значений (DIST10).
+    Число общих True для всех пар столбцов булевой маски (записи × признаки).
+    Столбцы упаковываются в биты (64 записи на слово uint64), счёт — AND + popcount.
+    Без np.bitwise_count (NumPy < 2.0) — matmul по маске.
     """
-    #return 0.0 #заглушка
+    num_features = mask.shape[1]
+    if not hasattr(np, 'bitwise_count'):
+        mask = mask.astype(float)
+        return mask.T @ mask
+
+    bits = np.packbits(mask, axis=0).T  # признаки × байты
+    pad = -bits.shape[1] % 8
+    words = np.ascontiguousarray(np.pad(bits, ((0, 0), (0, pad)))).view(np.uint64)
 
+    counts = np.zeros((num_features, num_features))
+    for a in range(num_features):
+        row = np.bitwise_count(words[a] & words[a:]).sum(axis=1)
+        counts[a, a:] = row
+        counts[a:, a] = row
+    return counts
+
+
+def join_percent_matrix(X, percent):
+    """
+    Коэффициент пересечения топ-% значений (DIST10) сразу для всех пар столбцов X.
+    Маска топ-% строится один раз на столбец, число общих записей — intersection_counts.
+    """
+    num_records, num_features = X.shape
+    result = np.zeros((num_features, num_features))
     if num_records < 2 or percent <= 0 or percent > 100:
-        return 0.0
+        return result
 
     cnt_sel = int(num_records * percent / 100.0)
     if cnt_sel == 0:
-        return 0.0
+        return result
+
+    top_idx = np.argpartition(X, -cnt_sel, axis=0)[-cnt_sel:]  # порядок внутри топа не важен
+    top = np.zeros(X.shape, dtype=bool)
+    top[top_idx, np.arange(num_features)] = True
+
+    cnt_11 = intersection_counts(top)
+    denominator = cnt_sel * 2 - cnt_11  # всегда >= cnt_sel > 0
 
-    indices_a = np.argsort([get_data(col_a, i) for i in range(num_records)])
-    indices_b = np.argsort([get_data(col_b, i) for i in range(num_records)])
+    return cnt_11 * 100.0 / denominator
 
-    top_a = set(indices_a[-cnt_sel:])
-    top_b = set(indices_b[-cnt_sel:])
 
-    cnt_11 = len(top_a.intersection(top_b))
-    denominator = cnt_sel * 2 - cnt_11
+def pair_index_table(stat_corr):
+    """
+    Таблица F×F индексов пар (симметричная, -1 — пары нет) вместо поиска get_pair_index.
+    """
+    num_features = len(stat_corr.column_names)
+    cols1, cols2, _ = stat_corr.get_pairs_array()
+    table = np.full((num_features, num_features), -1, dtype=np.int32)
+    table[cols1, cols2] = np.arange(len(cols1))
+    table[cols2, cols1] = np.arange(len(cols1))
+    return table
+
 
-    return (cnt_11 * 100.0 / denominator) if denominator != 0 else 0.0
+def pair_value_matrix(values, pair_idx_tab):
+    """
+    Матрица F×F значений пар (corr, rr — списки в порядке пар) по таблице pair_index_table.
+    Диагональ и отсутствующие пары — NaN.
+    """
+    values = np.append(np.asarray(values, dtype=float), np.nan)  # индекс -1 → NaN
+    return values[pair_idx_tab]
 
 
-def calculate_rr_for_pair(stat_corr, pair_idx, get_data, num_records):
+def calculate_rr_for_pair(stat_corr, pair_idx, pair_idx_tab=None):
     """
     Расчёт мета-корреляции RR для одной пары (Spearman между векторами корреляций).
     log_scale удалён — всегда без логарифмирования.
+    pair_idx_tab — таблица из pair_index_table (строится заново, если не передана).
     """
     pair = stat_corr.get_pair(pair_idx)
     col_a, col_b = pair.col1, pair.col2
@@ -72,13 +145,18 @@ def calculate_rr_for_pair(stat_corr, pair_idx, get_data, num_records):
         stat_corr.set_rr(pair_idx, 0.0)
         return
 
+    if pair_idx_tab is None:
+        pair_idx_tab = pair_index_table(stat_corr)
+    row_a = pair_idx_tab[col_a].tolist()
+    row_b = pair_idx_tab[col_b].tolist()
+
     corr_vec_a = []
     corr_vec_b = []
     for i in range(num_features):
         if i == col_a or i == col_b:
             continue
-        idx_ac = stat_corr.get_pair_index(min(col_a, i), max(col_a, i))
-        idx_bc = stat_corr.get_pair_index(min(col_b, i), max(col_b, i))
+        idx_ac = row_a[i]
+        idx_bc = row_b[i]
         if idx_ac == -1 or idx_bc == -1:
             continue
         corr_vec_a.append(stat_corr.get_corr(idx_ac))
@@ -89,42 +167,90 @@ def calculate_rr_for_pair(stat_corr, pair_idx, get_data, num_records):
         stat_corr.set_rr(pair_idx, 0.0)
         return
 
-    # Всегда без log_scale → используем scipy (или manual, если нужно)
-    value = spearmanr(corr_vec_a, corr_vec_b)[0]
+    # Всегда без log_scale; p-value не нужен
+    value = spearman_pair(corr_vec_a, corr_vec_b)
     stat_corr.set_rr(pair_idx, value)
 
 
+def rr_matrix(corr_matrix):
+    """
+    Мета-корреляция RR сразу для всех пар (Спирмен между строками матрицы R
+    без элементов самой пары). Каждая строка ранжируется один раз; ранги без
+    элемента пары получаются поправкой: −1 для значений больше исключённого,
+    −0.5 для равных ему. Результат совпадает с поштучным spearmanr.
+    """
+    num_features = corr_matrix.shape[0]
+    rr = np.zeros((num_features, num_features))
+    if num_features < 4:  # общих признаков меньше 2
+        return rr
+
+    off_diag = np.array(corr_matrix, dtype=float)
+    np.fill_diagonal(off_diag, np.nan)
+    ranks = rankdata(off_diag, axis=1, nan_policy='omit')  # диагональ не участвует
+    mean_rank = (num_features - 1) / 2.0  # среднее рангов 1..(F-2)
+
+    for a in range(num_features - 1):
+        bs = np.arange(a + 1, num_features)
+        r_ab = off_diag[a, bs, None]
+        r_ba = off_diag[bs, a, None]
+        ranks_a = ranks[a] - (off_diag[a] > r_ab) - 0.5 * (off_diag[a] == r_ab)
+        ranks_b = ranks[bs] - (off_diag[bs] > r_ba) - 0.5 * (off_diag[bs] == r_ba)
+
+        keep = np.ones((len(bs), num_features), dtype=bool)
+        keep[:, a] = False
+        keep[np.arange(len(bs)), bs] = False
+        dev_a = np.where(keep, ranks_a - mean_rank, 0.0)
+        dev_b = np.where(keep, ranks_b - mean_rank, 0.0)
+
+        # NaN среди корреляций или постоянный вектор → NaN, как у spearmanr
+        with np.errstate(invalid='ignore', divide='ignore'):
+            values = (dev_a * dev_b).sum(axis=1) / np.sqrt((dev_a ** 2).sum(axis=1) * (dev_b ** 2).sum(axis=1))
+        values = np.clip(values, -1.0, 1.0)
+        rr[a, bs] = values
+        rr[bs, a] = values
+
+    return rr
+
+
 def calculate_all_correlations(
     stat_corr: TStatCorr,
-    get_data,
-    num_records: int,
+    X: np.ndarray,
     percent10: int = 10,
+    ranks: np.ndarray = None,
 ):
     """
     Основная функция расчёта всех корреляций.
-
+    X — матрица данных (записи × признаки) в порядке stat_corr.column_names.
+    ranks — ранги столбцов X (например, из TData.get_ranks), чтобы не ранжировать заново.
     """
-    # 1. Расчёт DIST10 (не зависит от режима)
-    for i in range(stat_corr.count()):
-        pair = stat_corr.get_pair(i)
-        stat_corr.set_dist10(i, join_percent(stat_corr, pair.col1, pair.col2, get_data, num_records, percent10))
+    cols1, cols2, _ = stat_corr.get_pairs_array()
 
-    # 2. Расчёт Spearman R
-    for i in range(stat_corr.count()):
-        pair = stat_corr.get_pair(i)
-        col_a, col_b = pair.col1, pair.col2
+    # 1. Расчёт DIST10 (не зависит от режима)
+    dist10_matrix = join_percent_matrix(X, percent10)
+    stat_corr.set_pairs_values(dist10=dist10_matrix[cols1, cols2])
 
-        vals_a = np.array([get_data(col_a, rec) for rec in range(num_records)])
-        vals_b = np.array([get_data(col_b, rec) for rec in range(num_records)])
+    # 2. Расчёт Spearman R — матрица целиком
+    has_nan = np.isnan(X).any(axis=0)
+    corr = spearman_matrix(X, ranks)[cols1, cols2]
 
-        # Расчёт корреляции
-        corr, _ = spearmanr(vals_a, vals_b, nan_policy='omit')
+    # Пропуски исключаются попарно — только поштучный расчёт
+    for i in np.flatnonzero(has_nan[cols1] | has_nan[cols2]):
+        corr[i] = spearman_pair(X[:, cols1[i]], X[:, cols2[i]], nan_policy='omit')
 
-        stat_corr.set_corr(i, corr)
+    stat_corr.set_pairs_values(corr=corr)
 
     # 3. Расчёт RR (мета-корреляция)
-    for i in range(stat_corr.count()):
-        calculate_rr_for_pair(stat_corr, i, get_data, num_records)
+    num_features = len(stat_corr.column_names)
+    if stat_corr.count() == num_features * (num_features - 1) // 2:
+        # Все пары на месте — считаем матрицей
+        full_corr = np.zeros((num_features, num_features))
+        full_corr[cols1, cols2] = corr
+        full_corr[cols2, cols1] = corr
+        stat_corr.set_pairs_values(rr=rr_matrix(full_corr)[cols1, cols2])
+    else:
+        pair_idx_tab = pair_index_table(stat_corr)
+        for i in range(stat_corr.count()):
+            calculate_rr_for_pair(stat_corr, i, pair_idx_tab)
 
     # 4. Обновление всех статистик
     stat_corr.update_all_statistics()
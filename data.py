@@ -2,29 +2,157 @@
 import pandas as pd
 import numpy as np
 import os
+from pathlib import Path
+import io
+import copy
+import warnings
 import logging  # Для лога ошибок
+from concurrent.futures import ThreadPoolExecutor
+from scipy.stats import rankdata
 
 # Настройка логирования
 logging.basicConfig(filename='data_load.log', level=logging.WARNING, 
                     format='%(asctime)s - %(levelname)s - %(message)s')
 
-class TStat:
-    def __init__(self, min_val=0, max_val=0, mean=0, mean_l=0, min_bigger_zero=0):
-        self.min = min_val
-        self.max = max_val
-        self.mean = mean
-        self.mean_l = mean_l
-        self.min_bigger_zero = min_bigger_zero
+# Ключ метаданных кэша <fname>.feather: "версия:размер:mtime_ns" исходного файла
+_CACHE_SOURCE_KEY = b'mapcor_source'
+# Версия разбора в кэше — увеличивать при каждом изменении _parse_header / _parse_data_text
+# (и load_file до записи кэша), иначе кэш прежнего разбора будет читаться как действительный
+_CACHE_VERSION = 1
+
+
+def _parse_header(lines):
+    """
+    Разбор начала файла по первым двум значимым строкам.
+    Возвращает (названия столбцов, индекс строки заголовка среди lines).
+    """
+    # Автоопределение формата
+    try:
+        expected_cols = int(lines[0])
+        header_line_idx = 1
+    except ValueError:
+        expected_cols = None
+        header_line_idx = 0
+
+    # Заголовок
+    header_parts = lines[header_line_idx].split()
+    actual_header_cols = len(header_parts)
+
+    if expected_cols is None:
+        expected_cols = actual_header_cols
+    elif actual_header_cols != expected_cols:
+        logging.warning(f"Предупреждение: указано {expected_cols} столбцов, но в заголовке {actual_header_cols}")
+
+    return header_parts[:expected_cols], header_line_idx
+
+
+def _parse_data_text(data_text, column_names):
+    """
+    Разбор блока строк данных (без заголовка и комментариев, десятичная точка)
+    в DataFrame float64. Невалидные значения → NaN. Как в исходном построчном разборе,
+    заголовок обрезается по данным: названия сверх самой длинной строки отбрасываются
+    (а не дают столбцы из одних NaN). Лишние значения любой строки отбрасываются
+    с записью в лог, недостающие — NaN.
+    """
+    # Один разделитель без повторов — сначала многопоточный парсер pyarrow (если установлен).
+    # Строки с ошибками он не пропускает, а падает — тогда следующий парсер.
+    # Разделитель в начале или конце строки pyarrow считает пустым полем (короткая строка
+    # сдвинулась бы вправо) — такой текст сразу разбирают парсеры ниже, как строки без краёв
+    df = None
+    delimiter = '\t' if '\t' in data_text else ' '
+    padded = (data_text.startswith(delimiter) or data_text.endswith(delimiter)
+              or '\n' + delimiter in data_text or delimiter + '\n' in data_text)
+    if (('\t' in data_text) != (' ' in data_text)) and delimiter * 2 not in data_text and not padded:
+        try:
+            df = pd.read_csv(io.StringIO(data_text), sep=delimiter, header=None,
+                             names=column_names, engine='pyarrow')
+            # Значений в строках больше, чем названий: pyarrow добавляет безымянные столбцы
+            # слева и сдвигает данные вправо — такой результат не принимается
+            if list(df.columns) != list(column_names):
+                df = None
+        except Exception:
+            df = None
+
+    # Любые пробельные разделители — np.loadtxt: значения точно как у float(), быстрее
+    # C-парсера pandas. Невалидные значения и строки другой длины — к pandas с логом.
+    if df is None:
+        try:
+            values = np.loadtxt(io.StringIO(data_text), dtype=np.float64, comments=None, ndmin=2)
+            if values.shape[1] == len(column_names):
+                df = pd.DataFrame(values, columns=column_names, copy=False)
+        except ValueError:
+            df = None
+
+    # pyarrow и np.loadtxt принимают только строки ровно из len(column_names) значений;
+    # строки другой длины разбираются здесь
+    bad_rows = []
+    if df is None:
+        widths = [len(line.split()) for line in data_text.splitlines()]
+        max_width = max(widths, default=0)
+        if 0 < max_width < len(column_names):
+            logging.warning(f"Названий столбцов {len(column_names)}, а значений в строках не больше "
+                            f"{max_width} — лишние названия отброшены")
+            column_names = column_names[:max_width]
+
+        # Номера длинных строк — в лог
+        for line_no, width in enumerate(widths, 1):
+            if width > len(column_names):
+                bad_rows.append(f"Строка данных {line_no}: ожидалось {len(column_names)} значений, "
+                                f"найдено {width}, лишние отброшены")
+
+        # usecols — лишние значения отбрасываются одинаково в первой и в остальных строках
+        # (без него первая длинная строка молча обрезается, а следующие пропускаются)
+        df = pd.read_csv(io.StringIO(data_text), sep=r'\s+', header=None,
+                         names=column_names, usecols=range(len(column_names)), engine='c')
+
+    if bad_rows:
+        logging.warning("Обнаружены проблемные строки:")
+        for row_info in bad_rows[:5]:
+            logging.warning(row_info)
+        if len(bad_rows) > 5:
+            logging.warning(f"... и ещё {len(bad_rows) - 5} строк с ошибками")
+
+    if df.empty:
+        raise ValueError("Нет корректных строк данных")
+
+    # Невалидные значения → NaN
+    for col in df.select_dtypes(exclude='number').columns:
+        numeric = pd.to_numeric(df[col], errors='coerce')
+        bad_count = int(numeric.isna().sum() - df[col].isna().sum())
+        logging.warning(f"Невалидные значения в столбце '{col}': {bad_count} шт., заменены на NaN")
+        df[col] = numeric
+    if not (df.dtypes == 'float64').all():
+        df = df.astype('float64')
+    return df
+
 
 class TData:
     def __init__(self):
         self.filename = ""
         self.df = None  # Pandas DataFrame для данных
-        self.stats = []  # Список TStat для каждого столбца
+        # Статистика по столбцам — массивы, индекс = номер столбца
+        self._min = np.empty(0)
+        self._max = np.empty(0)
+        self._mean = np.empty(0)
+        self._mean_l = np.empty(0)
+        self._min_bz = np.empty(0)
         self.invalid_columns = []  # Список индексов столбцов с невалидными данными
         self.is_loaded = False
-
-    def load_file(self, fname):
+        self.dtype = np.dtype(np.float64)  # Тип хранения данных (float64 или float32)
+        self._X = None  # Данные как ndarray (записи × столбцы), строится в calc_stat
+        self._Xlog = None  # log10 данных для get_data_l, строится в calc_stat
+        self._ranks = None  # Ранги по столбцам для Спирмена, строятся при первом обращении
+        # Размеры и названия столбцов df для частых геттеров (df меняется только при загрузке)
+        self._nrows = 0
+        self._ncols = 0
+        self._colnames = np.empty(0, dtype=object)
+        # Кэш get_full_statistics / get_geo_recommendations: ключ _cache_key() — (id(df), shape, столбцы)
+        self._stats_cache = None
+        self._stats_key = None
+        self._recs_cache = None
+        self._recs_key = None
+
+    def load_file(self, fname, dtype=np.float64):
         """
         Чтение файла в формате:
         Опционально: 1-я строка — количество столбцов (целое число)
@@ -37,83 +165,90 @@ class TData:
         - Поддержка Excel (.xlsx)
         - Обработка невалидных значений: лог + пометка столбца
         - Проверка на большие данные (столбцы <=200, строки <=65000)
+        - Кэш разобранных данных рядом с файлом (<fname>.feather, нужен pyarrow)
+        - dtype=np.float32 — хранение данных в float32 (вдвое меньше памяти);
+          статистики calc_stat всё равно накапливаются во float64
         """
         try:
+            self._stats_cache = self._recs_cache = None
+            self._stats_key = self._recs_key = None
             ext = os.path.splitext(fname)[1].lower()
 
-            if ext == '.xlsx':
+            # Кэш действителен только для того же исходного файла и той же версии разбора:
+            # версия, размер и mtime (нс) хранятся в метаданных схемы Feather и сверяются точно
+            cache_name = fname + '.feather'
+            source_stat = os.stat(fname)
+            source_key = f"{_CACHE_VERSION}:{source_stat.st_size}:{source_stat.st_mtime_ns}".encode()
+            from_cache = False
+            if os.path.exists(cache_name):
+                try:
+                    from pyarrow import feather
+                    table = feather.read_table(cache_name)
+                    if (table.schema.metadata or {}).get(_CACHE_SOURCE_KEY) == source_key:
+                        self.df = table.to_pandas()
+                        from_cache = True
+                        logging.info(f"Данные {fname} загружены из кэша {cache_name}")
+                except Exception as e:
+                    logging.warning(f"Кэш {cache_name} не прочитан ({e}), файл разбирается заново")
+
+            if from_cache:
+                pass  # Кэш новее исходного файла — разбор не нужен
+            elif ext == '.xlsx':
                 # Excel-поддержка
                 self.df = pd.read_excel(fname, engine='openpyxl', dtype='float64', header=0)
                 logging.info(f"Загружен Excel файл: {fname}, строк: {len(self.df)}, столбцов: {len(self.df.columns)}")
             else:
-                # Текстовый файл (CSV/TXT)
+                # Текстовый файл (CSV/TXT) — читается целиком
                 with open(fname, 'r', encoding='utf-8', errors='replace') as f:
-                    lines = []
-                    for line in f:
-                        stripped = line.strip()
-                        if stripped and not stripped.startswith(('#', '//', ';')):
-                            lines.append(stripped)  # Пропуск комментариев
+                    text = f.read()
+
+                # Построчно ищутся только первые две значимые строки (кол-во столбцов, заголовок)
+                lines = []
+                line_ends = []
+                pos = 0
+                while len(lines) < 2 and pos < len(text):
+                    end = text.find('\n', pos)
+                    end = len(text) if end == -1 else end + 1
+                    stripped = text[pos:end].strip()
+                    if stripped and not stripped.startswith(('#', '//', ';')):
+                        lines.append(stripped)  # Пропуск комментариев
+                        line_ends.append(end)
+                    pos = end
 
                 if len(lines) < 1:
                     raise ValueError("Файл пустой или содержит только комментарии")
 
-                # Автоопределение формата
-                try:
-                    expected_cols = int(lines[0])
-                    header_line_idx = 1
-                    data_start_idx = 2
-                except ValueError:
-                    expected_cols = None
-                    header_line_idx = 0
-                    data_start_idx = 1
-
-                # Заголовок
-                header_parts = lines[header_line_idx].split()
-                actual_header_cols = len(header_parts)
-
-                if expected_cols is None:
-                    expected_cols = actual_header_cols
-                elif actual_header_cols != expected_cols:
-                    logging.warning(f"Предупреждение: указано {expected_cols} столбцов, но в заголовке {actual_header_cols}")
-
-                column_names = header_parts[:expected_cols]
-
-                # Данные
-                data_lines = lines[data_start_idx:]
-                if not data_lines:
+                column_names, header_line_idx = _parse_header(lines)
+
+                # Столбцы известны по заголовку — лимит проверяется до разбора данных
+                if len(column_names) > 200:
+                    logging.warning(f"Данные превышают лимит: столбцов {len(column_names)} (>200)")
+                    raise ValueError("Данные слишком большие для обработки")
+
+                # Данные — весь текст после заголовка. Построчный фильтр нужен только при
+                # комментариях; пустые строки и пробелы по краям пропускает сам парсер
+                data_text = text[line_ends[header_line_idx]:]
+                if '#' in data_text or '/' in data_text or ';' in data_text:  # поиск одного символа — memchr
+                    data_lines = []
+                    for line in data_text.split('\n'):
+                        stripped = line.strip()
+                        if stripped and not stripped.startswith(('#', '//', ';')):
+                            data_lines.append(stripped)
+                    data_text = '\n'.join(data_lines)
+
+                if not data_text or data_text.isspace():
                     raise ValueError("Нет строк с данными")
 
-                data = []
-                bad_rows = []
-                for i, line in enumerate(data_lines, start=data_start_idx + 1):
-                    line = line.replace(',', '.')  # Десятичный разделитель
-                    try:
-                        row = []
-                        for val_str in line.split():
-                            try:
-                                row.append(float(val_str))
-                            except ValueError:
-                                row.append(np.nan)  # Невалидное значение → NaN
-                                logging.warning(f"Невалидное значение '{val_str}' в строке {i}, заменено на NaN")
-                        actual_cols = len(row)
-                        if actual_cols != expected_cols:
-                            bad_rows.append((i, f"Ожидалось {expected_cols} столбцов, найдено {actual_cols}"))
-                        data.append(row)
-                    except Exception as e:
-                        bad_rows.append((i, str(e)))
-                        continue
-
-                if bad_rows:
-                    logging.warning("Обнаружены проблемные строки:")
-                    for row_info in bad_rows[:5]:
-                        logging.warning(row_info)
-                    if len(bad_rows) > 5:
-                        logging.warning(f"... и ещё {len(bad_rows) - 5} строк с ошибками")
-
-                if not data:
-                    raise ValueError("Нет корректных строк данных")
-
-                self.df = pd.DataFrame(data, columns=column_names[:len(data[0])], dtype='float64')
+                # Строк не больше, чем переводов строки + 1; точный подсчёт непустых — только
+                # у файлов на границе лимита, разбор заведомо больших файлов не запускается
+                if data_text.count('\n') + 1 > 65000:
+                    num_rows = sum(1 for line in data_text.splitlines() if line and not line.isspace())
+                    if num_rows > 65000:
+                        logging.warning(f"Данные превышают лимит: строк {num_rows} (>65000)")
+                        raise ValueError("Данные слишком большие для обработки")
+
+                # Разбор целиком парсерами pandas; ',' → '.' одним проходом по тексту
+                self.df = _parse_data_text(data_text.replace(',', '.'), column_names)
 
             # Проверка на большие данные
             num_rows, num_cols = self.df.shape
@@ -121,46 +256,79 @@ class TData:
                 logging.warning(f"Данные превышают лимит: строк {num_rows} (>65000), столбцов {num_cols} (>200)")
                 raise ValueError("Данные слишком большие для обработки")
 
-            # Помечаем invalid столбцы (где >10% NaN или все NaN)
-            for col_idx, col in enumerate(self.df.columns):
-                nan_percent = self.df[col].isna().mean()
-                if nan_percent > 0.1:  # Или все NaN
-                    self.invalid_columns.append(col_idx)
-                    logging.warning(f"Столбец '{col}' помечен invalid: {nan_percent*100:.1f}% NaN")
+            if not from_cache:
+                try:
+                    import pyarrow as pa
+                    from pyarrow import feather
+                    table = pa.Table.from_pandas(self.df, preserve_index=False)
+                    table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                                           _CACHE_SOURCE_KEY: source_key})
+                    feather.write_feather(table, cache_name, compression='lz4')
+                except Exception as e:
+                    logging.info(f"Кэш {cache_name} не записан: {e}")
+
+            # Кэш хранит float64 — понижение точности только в памяти
+            self.dtype = np.dtype(dtype)
+            if self.dtype != np.float64:
+                self.df = self.df.astype(self.dtype, copy=False)
 
             self.filename = fname
-            self.df = self.df[sorted(self.df.columns)]  # Сортировка по алфавиту
+            if not self.df.columns.is_monotonic_increasing:
+                self.df.sort_index(axis=1, kind='stable', inplace=True)  # Сортировка по алфавиту
+
+            # Помечаем invalid столбцы (где >10% NaN или все NaN) — индексы после сортировки
+            nan_pct = self.df.isna().mean(axis=0).to_numpy()
+            self.invalid_columns = np.flatnonzero(nan_pct > 0.1).tolist()
+            for col_idx in self.invalid_columns:
+                logging.warning(f"Столбец '{self.df.columns[col_idx]}' помечен invalid: {nan_pct[col_idx]*100:.1f}% NaN")
+
             self.calc_stat()
             self.is_loaded = True
             return True
 
         except Exception as e:
-            logging.error(f"Ошибка загрузки {fname}: {e}")
-            import traceback
-            traceback.print_exc()
+            logging.exception(f"Ошибка загрузки {fname}: {e}")  # стек — в лог, только если запись пройдёт уровень
             return False
 
     def calc_stat(self):
-        self.stats = []
-        for col in self.df.columns:
-            values = self.df[col].dropna()  # Игнорируем NaN
-            if len(values) == 0:
-                continue
-
-            min_val = values.min()
-            max_val = values.max()
-            mean = values.mean()
+        self._nrows, self._ncols = self.df.shape
+        self._colnames = self.df.columns.to_numpy()
+        self._X = self.df.to_numpy(dtype=self.dtype, copy=False)
+        self._ranks = None
+        if self.df.empty:
+            self._Xlog = self._X
+            self._min = self._max = self._mean = self._mean_l = self._min_bz = np.empty(0)
+            return
+
+        A = self._X
+        valid = ~np.isnan(A)  # одна маска на все средние вместо копий внутри nanmean
+        count = valid.sum(axis=0)
+        with warnings.catch_warnings(), np.errstate(invalid='ignore', divide='ignore'):
+            warnings.simplefilter('ignore', RuntimeWarning)  # столбцы целиком из NaN
+            mins = np.nanmin(A, axis=0)
+            maxs = np.nanmax(A, axis=0)
+            means = np.add.reduce(A, axis=0, dtype=np.float64, where=valid) / count
 
             # Min bigger zero
-            positive = values[values > 0]
-            min_bigger_zero = positive.min() if not positive.empty else 0.1
+            min_bigger_zero = np.minimum.reduce(A, axis=0, where=A > 0, initial=np.inf)
+            min_bigger_zero[np.isinf(min_bigger_zero)] = 0.1
+
+            # Mean log (mean_l) — в одном буфере
+            log_values = np.maximum(A, min_bigger_zero / 2, dtype=np.float64)  # Избежать log(0)
+            np.log10(log_values, out=log_values)
+            mean_l = np.add.reduce(log_values, axis=0, where=valid) / count
+
+        # Тот же буфер — данные для get_data_l: NaN → log10(min_bigger_zero / 2) своего столбца
+        np.copyto(log_values, np.log10(min_bigger_zero / 2, dtype=np.float64), where=~valid)
+        self._Xlog = log_values
 
-            # Mean log (mean_l)
-            log_values = np.log10(values.clip(lower=min_bigger_zero / 2))  # Избежать log(0)
-            mean_l = log_values.mean()
+        self._min, self._max, self._mean = mins, maxs, means
+        self._mean_l, self._min_bz = mean_l, min_bigger_zero
 
-            self.stats.append(TStat(min_val, max_val, mean, mean_l, min_bigger_zero))
 
+    def _cache_key(self):
+        """Ключ кэшей статистики: тот же df, та же форма и те же названия столбцов"""
+        return (id(self.df), self.df.shape, tuple(self.df.columns))
 
     def get_full_statistics(self):
         """
@@ -170,38 +338,94 @@ class TData:
         if self.df is None or self.df.empty:
             return None
 
-        import pandas as pd
-        import numpy as np
-        from scipy.stats import skew, kurtosis
-
-        desc = self.df.describe(percentiles=[0.05, 0.25, 0.5, 0.75, 0.95]).T
+        # Повторный вызов для того же df и тех же признаков — из кэша (копия: вызывающие дописывают столбцы)
+        key = self._cache_key()
+        if self._stats_key == key:
+            return self._stats_cache.copy()
+
+        # Все характеристики по одному массиву (признаки × записи, строка = столбец df):
+        # одна сортировка — min/max/процентили/уникальные, одни отклонения — моменты.
+        # Формулы повторяют pandas (describe/var/skew/kurtosis) и np.percentile(method='linear')
+        A = np.ascontiguousarray(self.df.to_numpy(dtype=np.float64).T)
+        num_records = A.shape[1]
+        valid = ~np.isnan(A)
+        count = valid.sum(axis=1).astype(np.float64)
+        last = np.maximum(count.astype(np.intp) - 1, 0)
+        rows = np.arange(A.shape[0])
+
+        sorted_A = np.sort(A, axis=1)  # NaN в конце строки
+
+        def sorted_quantile(q):
+            virtual = (count - 1) * q
+            lower = np.floor(virtual)
+            gamma = virtual - lower
+            lo = np.clip(lower, 0, None).astype(np.intp)
+            hi = np.minimum(lo + 1, last)
+            a, b = sorted_A[rows, lo], sorted_A[rows, hi]
+            diff = b - a
+            result = np.where(gamma >= 0.5, b - diff * (1 - gamma), a + diff * gamma)
+            return np.where(count > 0, result, np.nan)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(valid, A, 0.0).sum(axis=1) / count
+            deviation = A - mean[:, None]
+            deviation[~valid] = 0.0
+            deviation2 = deviation ** 2
+            m2 = deviation2.sum(axis=1)
+            m3 = (deviation2 * deviation).sum(axis=1)
+            m4 = (deviation2 ** 2).sum(axis=1)
+            del deviation, deviation2
+
+            variance = np.where(count > 1, m2 / (count - 1), np.nan)
+
+            # Погрешность float: |m| < 1e-14 считается нулём (как в pandas)
+            m2_z = np.where(np.abs(m2) < 1e-14, 0.0, m2)
+            m3_z = np.where(np.abs(m3) < 1e-14, 0.0, m3)
+            skewness = (count * (count - 1) ** 0.5 / (count - 2)) * (m3_z / m2_z ** 1.5)
+            skewness = np.where(m2_z == 0, 0.0, skewness)
+            skewness[count < 3] = np.nan
+
+            numerator = count * (count + 1) * (count - 1) * m4
+            denominator = (count - 2) * (count - 3) * m2 ** 2
+            numerator = np.where(np.abs(numerator) < 1e-14, 0.0, numerator)
+            denominator = np.where(np.abs(denominator) < 1e-14, 0.0, denominator)
+            kurt = numerator / denominator - 3 * (count - 1) ** 2 / ((count - 2) * (count - 3))
+            kurt = np.where(denominator == 0, 0.0, kurt)
+            kurt[count < 4] = np.nan
+
+        desc = pd.DataFrame({
+            'count': count,
+            'mean': mean,
+            'std': np.sqrt(variance),
+            'min': np.where(count > 0, sorted_A[:, 0], np.nan),
+            '5%': sorted_quantile(0.05),
+            '25%': sorted_quantile(0.25),
+            '50%': sorted_quantile(0.5),
+            '75%': sorted_quantile(0.75),
+            '95%': sorted_quantile(0.95),
+            'max': np.where(count > 0, sorted_A[rows, last], np.nan),
+        }, index=self.df.columns)
 
         # Дополнительные метрики
-        desc['skew']              = self.df.skew(numeric_only=True).round(3)
-        desc['kurtosis']          = self.df.kurtosis(numeric_only=True).round(3)
-        desc['nan_percent']       = (self.df.isna().mean() * 100).round(2)
-
-        desc['below_lod_percent'] = ((self.df <= 0.03) | self.df.isna()).mean() * 100
-        desc['below_lod_percent'] = desc['below_lod_percent'].round(1)
+        desc['skew']              = np.round(skewness, 3)
+        desc['kurtosis']          = np.round(kurt, 3)
+        desc['nan_percent']       = np.round((num_records - count) / num_records * 100, 2)
 
-        # Процент повторяющихся минимальных значений
-        def repeating_min_ratio(col):
-            if col.isna().all():
-                return 0.0
-            min_val = col.min()
-            if pd.isna(min_val):
-                return 0.0
-            count_min = (col == min_val).sum()
-            total = len(col)
-            return (count_min / total * 100) if total > 0 else 0.0
+        # Одно сравнение на оба процента: (A == 0) входит в (A <= 0.03), NaN с ним не пересекается
+        le_lod_count = (A <= 0.03).sum(axis=1)
+        below_lod_count = le_lod_count + (num_records - count)
+        desc['below_lod_percent'] = np.round(below_lod_count / num_records * 100, 1)
 
-        desc['repeating_min_percent'] = self.df.apply(repeating_min_ratio).round(1)
+        # Процент повторяющихся минимальных значений (от всех записей, с NaN)
+        min_count = (A == sorted_A[:, :1]).sum(axis=1)
+        desc['repeating_min_percent'] = np.round(np.where(count > 0, min_count / num_records * 100, 0.0), 1)
 
-        desc['zero_percent']      = ((self.df == 0) | (self.df <= 0.03)).mean() * 100
-        desc['zero_percent']      = desc['zero_percent'].round(1)
+        desc['zero_percent']      = np.round(le_lod_count / num_records * 100, 1)
 
-        desc['unique_count']      = self.df.nunique()
-        desc['variance']          = self.df.var(numeric_only=True).round(6)
+        # Уникальные: в отсортированной строке — число смен значения среди не-NaN
+        changes = (sorted_A[:, 1:] != sorted_A[:, :-1]) & (np.arange(1, num_records) < count[:, None])
+        desc['unique_count']      = np.where(count > 0, changes.sum(axis=1) + 1, 0)
+        desc['variance']          = np.round(variance, 6)
 
         # ─── Новая метрика: CV, % ───────────────────────────────────────────────
         # CV = std / mean * 100, с защитой от деления на 0
@@ -213,39 +437,38 @@ class TData:
 
 
         # ── J (информативность по Шеннону, нормированная на 6 интервалов) ────────────────
-        def compute_entropy_norm(series, n_bins=6):
-            """
-            Информативность J — мера однородности геологического признака.
-            Диапазон: [0, 1]
-            J → 0: монолитный пласт (все значения в одном интервале)
-            J → 1: равномерное распределение по всем 6 интервалам (макс. гетерогенность)
-            """
-            series = series.dropna()
-            if len(series) < 2:
-                return np.nan
-            
-            try:
-                # Гистограмма по фиксированным 6 интервалам
-                hist, _ = np.histogram(series, bins=n_bins)
-                total = hist.sum()
-                if total == 0:
-                    return np.nan
-                
-                # Вероятности только для непустых интервалов (защита от log2(0))
-                p = hist[hist > 0] / total
-                
-                # Энтропия Шеннона
-                H = -np.sum(p * np.log2(p))
-                
-                # Нормировка НА ФИКСИРОВАННОЕ число интервалов (6), а не на количество непустых!
-                H_max = np.log2(n_bins)
-                J = H / H_max
-                return J
-            
-            except Exception:
-                return np.nan
-
-        desc['J'] = self.df.apply(lambda col: compute_entropy_norm(col, n_bins=6)).round(3)
+        # Информативность J — мера однородности геологического признака. Диапазон: [0, 1]
+        # J → 0: монолитный пласт (все значения в одном интервале)
+        # J → 1: равномерное распределение по всем 6 интервалам (макс. гетерогенность)
+        # Гистограммы всех столбцов сразу; интервалы и попадание в них — как в np.histogram(bins=6)
+        n_bins = 6
+        with np.errstate(invalid='ignore', divide='ignore'):
+            first_edge = sorted_A[:, 0].copy()
+            last_edge = sorted_A[rows, last].copy()
+            flat = first_edge == last_edge
+            first_edge[flat] -= 0.5
+            last_edge[flat] += 0.5
+            # Меньше 2 значений или бесконечности — J не определена
+            has_hist = (count >= 2) & np.isfinite(first_edge) & np.isfinite(last_edge)
+            bin_edges = np.linspace(first_edge, last_edge, n_bins + 1, axis=1)
+
+            values = np.where(valid, A, first_edge[:, None])
+            bin_idx = ((values - first_edge[:, None]) / (last_edge - first_edge)[:, None] * n_bins)
+            bin_idx = np.where(has_hist[:, None], bin_idx, 0).astype(np.intp)
+        bin_idx[bin_idx == n_bins] -= 1
+        # Поправка на ~1 ULP у границ интервалов; правая граница входит в последний интервал
+        bin_idx -= values < np.take_along_axis(bin_edges, bin_idx, axis=1)
+        bin_idx += (values >= np.take_along_axis(bin_edges, bin_idx + 1, axis=1)) & (bin_idx != n_bins - 1)
+
+        hist = np.zeros((A.shape[0], n_bins))
+        np.add.at(hist, (np.broadcast_to(rows[:, None], A.shape)[valid], bin_idx[valid]), 1)
+
+        # Энтропия Шеннона по непустым интервалам (защита от log2(0)),
+        # нормировка НА ФИКСИРОВАННОЕ число интервалов (6), а не на количество непустых!
+        with np.errstate(invalid='ignore', divide='ignore'):
+            p = hist / hist.sum(axis=1, keepdims=True)
+            entropy = -np.where(hist > 0, p * np.log2(p), 0.0).sum(axis=1)
+        desc['J'] = np.round(np.where(has_hist, entropy / np.log2(n_bins), np.nan), 3)
 
         # Округление
         desc = desc.round({
@@ -278,7 +501,8 @@ class TData:
         existing_cols = [c for c in columns_order if c in desc.columns]
         desc = desc[existing_cols]
 
-        return desc
+        self._stats_cache, self._stats_key = desc, key
+        return desc.copy()
 
 
     def get_geo_recommendations(self):
@@ -291,8 +515,10 @@ class TData:
         if self.df is None or self.df.empty:
             return {}
 
-        import pandas as pd
-        import numpy as np
+        # Тот же ключ, что у get_full_statistics; копия — вызывающие могут менять словари
+        key = self._cache_key()
+        if self._recs_key == key:
+            return copy.deepcopy(self._recs_cache)
 
         df = self.df.select_dtypes(include=[np.number])  # только числовые столбцы
 
@@ -359,24 +585,50 @@ class TData:
                 'recommendation': " ".join(rec_parts)
             }
 
-        return recommendations
+        self._recs_cache, self._recs_key = recommendations, key
+        return copy.deepcopy(recommendations)
 
     def get_data(self, col, rec):
-        return self.df.iloc[rec, col]
+        return self._X[rec, col]
+
+    def get_matrix(self):
+        """Данные целиком как ndarray (записи × столбцы) без копирования."""
+        return self._X
+
+    def get_ranks(self):
+        """
+        Ранги значений по столбцам (записи × столбцы, связки — средний ранг), считаются
+        один раз на загруженные данные: повторные расчёты берут нужные столбцы отсюда.
+        Столбец с NaN — целиком NaN. float32 хранит ранги (до 65000, шаг 0.5) точно.
+        Столбцы ранжируются блоками в потоках: сортировка numpy отпускает GIL.
+        """
+        if self._ranks is None:
+            X = self._X
+            ranks = np.empty(X.shape, dtype=np.float32)
+
+            def rank_block(cols):
+                ranks[:, cols] = rankdata(X[:, cols], axis=0)
+
+            num_workers = min(os.cpu_count() or 1, X.shape[1])
+            if num_workers > 1:
+                with ThreadPoolExecutor(max_workers=num_workers) as executor:
+                    list(executor.map(rank_block, np.array_split(np.arange(X.shape[1]), num_workers)))
+            else:
+                rank_block(slice(None))
+            self._ranks = ranks
+        return self._ranks
 
     def get_data_l(self, col, rec):
-        value = self.get_data(col, rec)
-        min_bz = self.get_min_bigger_zero(col)
-        return np.log10(value) if value > 0 else np.log10(min_bz / 2)
+        return self._Xlog[rec, col]
 
     def get_count_column(self):
-        return len(self.df.columns) if self.df is not None else 0
+        return self._ncols
 
     def get_count_record(self):
-        return len(self.df) if self.df is not None else 0
+        return self._nrows
 
     def get_column_name(self, col):
-        return self.df.columns[col]
+        return self._colnames[col]
 
     def get_number_for_column_name(self, col_name):
         try:
@@ -385,25 +637,36 @@ class TData:
             return -1
 
     def get_min(self, col):
-        return self.stats[col].min
+        return float(self._min[col])
 
     def get_max(self, col):
-        return self.stats[col].max
+        return float(self._max[col])
 
     def get_mean(self, col):
-        return self.stats[col].mean
+        return float(self._mean[col])
 
     def get_mean_l(self, col):
-        return self.stats[col].mean_l
+        return float(self._mean_l[col])
 
     def get_min_bigger_zero(self, col):
-        return self.stats[col].min_bigger_zero
+        return float(self._min_bz[col])
+
+    @property
+    def filename(self):
+        return self._filename
+
+    @filename.setter
+    def filename(self, value):
+        # Имя и папка файла разбираются один раз — для заголовков отчётов и статусбара
+        self._filename = value
+        self.filename_base = Path(value).name
+        self.filename_dir = os.path.dirname(value)
 
     def get_file_name(self):
         return self.filename
 
     def get_column_names(self):
-        return list(self.df.columns)
+        return self._colnames.tolist()
 
     def round_b(self, value, m):
         e = 10 ** m
@@ -422,10 +685,6 @@ class TData:
         Возвращает:
             True — если сохранено успешно, False — при ошибке или отмене
         """
-        import pandas as pd
-        from pathlib import Path
-        from PySide6.QtWidgets import QFileDialog
-
         # Получаем основную статистику
         stats_df = self.get_full_statistics()
         if stats_df is None or stats_df.empty:
@@ -441,6 +700,7 @@ class TData:
 
         # Если имя файла не указано — открываем диалог
         if filename is None:
+            from PySide6.QtWidgets import QFileDialog  # Qt нужен только для диалога
             default_name = str(Path(self.filename).with_suffix('.statistics.txt')) if self.filename else "statistics.txt"
             fname, _ = QFileDialog.getSaveFileName(
                 None,
@@ -16,32 +16,27 @@ import sys
 import os
 from pathlib import Path
 import datetime
+import io
+import html
 import pandas as pd
 import numpy as np
-import tkinter as tk
 import json
-import subprocess
+import logging
+from types import MappingProxyType
 
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QGroupBox, QTableView,
     QStatusBar,  QFileDialog, QMessageBox,
     QHeaderView, QDialog, QLabel, QCheckBox, QPushButton, QScrollArea, QGridLayout,
-    QDoubleSpinBox, QSpinBox
+    QDoubleSpinBox, QSpinBox, QAbstractItemView
 )
-from PySide6.QtCore import Qt, QUrl
-from PySide6.QtGui import QStandardItemModel, QStandardItem, QDesktopServices, QFont, QColor
+from PySide6.QtCore import Qt, QUrl, QAbstractTableModel, QModelIndex, QTimer
+from PySide6.QtGui import QDesktopServices, QFont
 
 from data import TData
 from stat_corr_types import TStatCorr, TExtendedStat
-from corr_calculations import calculate_all_correlations
-
-from docx import Document
-from docx.shared import Mm, Pt, RGBColor, Inches
-from docx.enum.text import WD_ALIGN_PARAGRAPH, WD_TAB_ALIGNMENT
-from docx.enum.table import WD_TABLE_ALIGNMENT
-from docx.oxml.ns import qn
-from docx.enum.section import WD_SECTION_START
+from corr_calculations import calculate_all_correlations, pair_index_table, pair_value_matrix
 
 
 
@@ -66,65 +61,166 @@ COLOR_SCALE = [
     '#d65a54',   # 13 — бледно-красный (финал, без агрессии)
 ]
 
-def get_color_index(value, min_val, max_val, median=None):
+# CSS-классы фона c0..c13 по индексу COLOR_SCALE: ячейки отчёта ссылаются на класс, а не несут inline style
+COLOR_CSS_LINES = [f"    .c{i} {{background: {color};}}" for i, color in enumerate(COLOR_SCALE)]
+
+# Шаблоны ячеек значений отчётов — format связан один раз, а не f-строка на каждую ячейку.
+# Ячейки без отступов и переводов строк: браузеру они не нужны, а в большом отчёте это заметная доля файла
+_TD_NUM = '<td class="num c{c}">{v:.3f}</td>'.format
+_TD_NA = '<td class="na">—</td>'
+
+
+def get_color_indices(values, min_val, max_val, median=None):
     """
-    Основная функция вычисления индекса цвета (0..13)
+    Индексы цвета (0..13) сразу для массива значений.
     Логика идентична getColorOfMedian в Delphi
-    
+
     Параметры:
-        value   — текущее значение
+        values  — массив значений
         min_val — минимум диапазона
         max_val — максимум диапазона
         median  — медиана (если None — линейное деление)
-    
-    Возвращает: индекс 0..13
+
+    Возвращает: массив индексов 0..13 (округление банковское — np.rint)
     """
-    if np.isnan(value):
-        return 7  # середина, серый
-    
-    # Защита от выхода за границы
-    value = max(min_val, min(max_val, value))
-    
+    values = np.asarray(values, dtype=float)
+    clipped = np.clip(values, min_val, max_val)  # Защита от выхода за границы
+
     if median is not None:
-        # Деление относительно медианы 
-        if value >= median:
-            # Выше медианы → индексы 7..13 (7 интервалов)
-            portion = (value - median) / (max_val - median) if max_val > median else 0
-            ind = round(portion * 7) + 6
-            ind = min(13, max(7, ind))
-        else:
-            # Ниже медианы → индексы 0..6
-            portion = (value - min_val) / (median - min_val) if median > min_val else 0
-            ind = round(portion * 7)
-            ind = min(6, max(0, ind))
+        # Выше медианы → 7..13, ниже → 0..6
+        above = (clipped - median) / (max_val - median) if max_val > median else np.zeros_like(clipped)
+        below = (clipped - min_val) / (median - min_val) if median > min_val else np.zeros_like(clipped)
+        ind = np.where(clipped >= median,
+                       np.clip(np.rint(above * 7) + 6, 7, 13),
+                       np.clip(np.rint(below * 7), 0, 6))
     else:
         # Линейное деление всего диапазона на 14 частей
-        portion = (value - min_val) / (max_val - min_val) if max_val > min_val else 0
-        ind = round(portion * 13)
-        ind = min(13, max(0, ind))
-    
-    return ind
+        portion = (clipped - min_val) / (max_val - min_val) if max_val > min_val else np.zeros_like(clipped)
+        ind = np.clip(np.rint(portion * 13), 0, 13)
 
+    ind[np.isnan(values)] = 7  # середина, серый
+    return ind.astype(int)
 
-def get_color_for_r(value, median=None):
-    """Цвет для Spearman R (диапазон -1..1)"""
-    return COLOR_SCALE[get_color_index(value, -1.0, 1.0, median)]
 
+def get_colors(values, min_val, max_val, median=None):
+    """Цвета COLOR_SCALE для массива значений (список строк в порядке values)"""
+    return [COLOR_SCALE[i] for i in get_color_indices(values, min_val, max_val, median).tolist()]
 
-def get_color_for_rr(value, median=None):
-    """Цвет для RR (мета-корреляция, тоже -1..1)"""
-    return COLOR_SCALE[get_color_index(value, -1.0, 1.0, median)]
 
+# ────────────────────────────────────────────────────────────────
+# Настройки отчёта статистики: какие столбцы показывать в таблице
+# ────────────────────────────────────────────────────────────────
+SHOW_COLUMNS = MappingProxyType({
+    'count'                  : False,
+    'nan_percent'            : False,
+    'min'                    : True,
+    'repeating_min_percent'  : True,
+    'below_lod_percent'      : False,
+    'zero_percent'           : False,
+    '5%'                     : False,
+    'Q1'                     : False,
+    'median'                 : True,
+    'Q3'                     : False,
+    '95%'                    : False,
+    'max'                    : True,
+    'mean'                   : True,
+    'std'                    : True,
+    'CV_percent'             : True,
+    'variance'               : False,
+    'skew'                   : False,   # скрыт по умолчанию
+    'kurtosis'               : False,  # скрыт по умолчанию
+    'unique_count'           : False,
+    'J'                      : True,
+})
+
+# Видимые столбцы в порядке SHOW_COLUMNS (совпадает с порядком get_full_statistics)
+VISIBLE_STATS_COLUMNS = tuple(col for col, show in SHOW_COLUMNS.items() if show)
+
+# ────────────────────────────────────────────────────────────────
+# Настройки отчёта статистики: какие пункты показывать в легенде
+# ────────────────────────────────────────────────────────────────
+SHOW_LEGEND_ITEMS = MappingProxyType({
+    'count'                  : False,
+    'nan_percent'            : False,
+    'min_max'                : True,
+    'repeating_min_percent'  : True,
+    'below_lod_percent'      : False,
+    'zero_percent'           : False,
+    'percentiles'            : False,
+    'quartiles_median'       : False,
+    'mean_std'               : True,
+    'CV_percent'             : True,
+    'variance'               : False,
+    'skew_kurtosis'          : False,
+    'unique_count'           : False,
+    'J'                      : True,
+})
+
+# Заголовки столбцов таблицы статистики (по умолчанию — имя столбца)
+STATS_TITLES = MappingProxyType({
+    'repeating_min_percent': 'Мин. повт., %',
+    'below_lod_percent'    : '≤LOD, %',
+    'zero_percent'         : 'Нули, %',
+    'CV_percent'           : 'CV, %',
+    'nan_percent'          : 'NaN, %',
+    'unique_count'         : 'Уник.',
+    'variance'             : 'Var',
+    'J'                    : 'J (информ.)',
+})
+
+# Формат значений таблицы статистики по группам столбцов; остальные столбцы — str()
+STATS_VALUE_FORMATS = (
+    ('%.3f', frozenset({'min', '5%', 'Q1', 'median', 'Q3', '95%', 'max', 'mean', 'std', 'J'})),
+    ('%.1f', frozenset({'CV_percent', 'below_lod_percent', 'repeating_min_percent', 'zero_percent', 'nan_percent'})),
+    ('%.6f', frozenset({'variance'})),
+)
 
-def get_color_for_dist10(value, median=None):
-    """Цвет для DIST10 (0..100)"""
-    return COLOR_SCALE[get_color_index(value, 0.0, 100.0, median)]
+# Атрибут class заголовков столбцов таблицы статистики
+STATS_COL_CLASS = MappingProxyType({
+    '5%'               : " class='percentile'",
+    'Q1'               : " class='percentile'",
+    'Q3'               : " class='percentile'",
+    '95%'              : " class='percentile'",
+    'below_lod_percent': " class='lod-col'",
+    'CV_percent'       : " class='cv-col'",
+    'J'                : " class='j-col'",
+})
 
 
 # ────────────────────────────────────────────────────────────────
 # Дальше идут классы и остальной код
 # ────────────────────────────────────────────────────────────────
 
+class NumpyTableModel(QAbstractTableModel):
+    """
+    Модель таблицы исходных данных поверх матрицы (записи × столбцы) без копирования.
+    Значения форматируются в data() — только для ячеек, которые таблица рисует.
+    """
+    def __init__(self, arr, column_names, parent=None):
+        super().__init__(parent)
+        self._arr = arr
+        self._cols = list(column_names)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._arr.shape[0]
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._arr.shape[1]
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or not index.isValid():
+            return None
+        val = float(self._arr[index.row(), index.column()])
+        return f"{val:.4g}" if val == val else "—"  # NaN → "—"
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self._cols[section]
+        return str(section + 1)
+
+
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -194,6 +290,7 @@ class MainWindow(QMainWindow):
         self.table_view.setAlternatingRowColors(True)
         self.table_view.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
         self.table_view.verticalHeader().setVisible(False)
+        self.table_view.setEditTriggers(QAbstractItemView.NoEditTriggers)
         right_layout.addWidget(self.table_view)
 
         right_column.addWidget(right_group, stretch=1)  # таблица растягивается
@@ -276,31 +373,40 @@ class MainWindow(QMainWindow):
         self.working_directory = self._load_settings_from_file()
         
         # ─── Подключение сигналов сохранения ───────────────────────────────
-        self.threshold_root_spin.valueChanged.connect(self._save_settings)
-        self.threshold_avg_spin.valueChanged.connect(self._save_settings)
-        self.max_iters_spin.valueChanged.connect(self._save_settings)
-        self.convergence_epsilon_spin.valueChanged.connect(self._save_settings)
-
-
-    def _save_settings(self):
-        """Сохраняет все настройки в settings.json"""
-        settings = {
-            "threshold_root": round(self.threshold_root_spin.value(), 2),
-            "threshold_avg": round(self.threshold_avg_spin.value(), 2),
-            "max_iters": self.max_iters_spin.value(),
-            "convergence_epsilon": round(self.convergence_epsilon_spin.value(), 2)
-        }
-        try:
-            with open("settings.json", "w", encoding="utf-8") as f:
-                json.dump(settings, f, indent=2, ensure_ascii=False)
-        except Exception as e:
-            print("Ошибка сохранения настроек:", e)
-            # можно QMessageBox.warning(self, "Ошибка", f"Не удалось сохранить настройки:\n{str(e)}")
+        # Прокрутка колесом даёт серию valueChanged — запись одна, через 500 мс после последнего
+        self._last_settings = None
+        self._data_model = None  # NumpyTableModel таблицы данных (act_open)
+        self._last_stats_docx_key = None  # последний экспорт статистики в Word (act_save_stats_to_word)
+        self._last_stats_docx_bytes = None
+        self._settings_timer = QTimer(self)
+        self._settings_timer.setSingleShot(True)
+        self._settings_timer.setInterval(500)
+        self._settings_timer.timeout.connect(self._save_settings)
+        self.threshold_root_spin.valueChanged.connect(self._schedule_save_settings)
+        self.threshold_avg_spin.valueChanged.connect(self._schedule_save_settings)
+        self.max_iters_spin.valueChanged.connect(self._schedule_save_settings)
+        self.convergence_epsilon_spin.valueChanged.connect(self._schedule_save_settings)
+
+    def _schedule_save_settings(self, *_):
+        """Перезапускает таймер отложенного сохранения настроек"""
+        self._settings_timer.start()
+
+
+    @property
+    def working_directory(self):
+        return self._working_directory
+
+    @working_directory.setter
+    def working_directory(self, value):
+        # Существование проверяется один раз при смене директории, а не при каждом диалоге
+        self._working_directory = value
+        self._working_dir_path = Path(value)
+        self._working_dir_exists = self._working_dir_path.is_dir()
 
     def _get_initial_dir(self):
         """Возвращает начальную директорию для файловых диалогов"""
         # Проверяем, существует ли рабочая директория
-        if os.path.isdir(self.working_directory):
+        if self._working_dir_exists:
             return self.working_directory
         else:
             # Если нет, используем текущую директорию
@@ -334,9 +440,14 @@ class MainWindow(QMainWindow):
             "convergence_epsilon": round(self.convergence_epsilon_spin.value(), 2),
             "working_directory": self.working_directory
         }
+        if settings == self._last_settings:
+            return  # Ничего не изменилось — диск не трогаем
         try:
-            with open("settings.json", "w", encoding="utf-8") as f:
-                json.dump(settings, f, indent=2, ensure_ascii=False)
+            # Атомарная запись: сначала временный файл, затем замена
+            tmp_path = Path("settings.json.tmp")
+            tmp_path.write_text(json.dumps(settings, indent=2, ensure_ascii=False), encoding="utf-8")
+            tmp_path.replace("settings.json")
+            self._last_settings = settings
         except Exception as e:
             print("Ошибка сохранения настроек:", e)
             # можно QMessageBox.warning(self, "Ошибка", f"Не удалось сохранить настройки:\n{str(e)}")
@@ -388,7 +499,6 @@ class MainWindow(QMainWindow):
 
         # Диалог сохранения
         default_name = "Ассоциации_" + datetime.datetime.now().strftime("%Y-%m-%d_%H-%M") + ".docx"
-        import os
         tempfname = os.path.join(self._get_initial_dir(), default_name)
         fname, _ = QFileDialog.getSaveFileName(
             self,
@@ -404,6 +514,11 @@ class MainWindow(QMainWindow):
         # Обновляем рабочую директорию на директорию сохраненного файла
         self.working_directory = os.path.dirname(fname)
 
+        # python-docx (вместе с lxml) нужен только здесь — импорт при первом отчёте
+        from docx import Document
+        from docx.shared import Pt, Inches
+        from docx.enum.text import WD_ALIGN_PARAGRAPH
+
         # Создаём документ
         doc = Document()
 
@@ -431,12 +546,17 @@ class MainWindow(QMainWindow):
         # Подзаголовок с именем файла и датой
         p = doc.add_paragraph()
         p.add_run(f"Файл данных: ").bold = True
-        p.add_run(f"{Path(self.data.filename).name if self.data.filename else 'не загружен'}\n")
+        p.add_run(f"{self.data.filename_base or 'не загружен'}\n")
         p.add_run(f"Дата формирования: ").bold = True
         p.add_run(datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
 
         doc.add_paragraph()  # пустая строка
 
+        # Размеры ассоциаций — один проход, дальше маски
+        sizes = np.fromiter((len(c['features']) for c in self.associations), dtype=np.int32,
+                            count=len(self.associations))
+        is_single = sizes == 1
+
         # Параметры расчёта
         doc.add_heading("Параметры формирования ассоциаций", level=2)
         params_table = doc.add_table(rows=5, cols=2)
@@ -449,7 +569,7 @@ class MainWindow(QMainWindow):
             ("Порог средней корреляции с кластером", f"{self.threshold_avg_spin.value():.2f}"),
             ("Максимальное количество итераций", str(self.max_iters_spin.value())),
             ("Порог сходимости (доля перемещённых)", f"{self.convergence_epsilon_spin.value():.2f}"),
-            ("Количество ассоциаций / одиночных", f"{len([c for c in self.associations if len(c['features']) > 1])} / {len([c for c in self.associations if len(c['features']) == 1])}")
+            ("Количество ассоциаций / одиночных", f"{np.count_nonzero(sizes > 1)} / {np.count_nonzero(is_single)}")
         ]
 
         for i, (label, value) in enumerate(rows_data):
@@ -462,12 +582,10 @@ class MainWindow(QMainWindow):
         doc.add_heading("Ассоциации признаков", level=2)
 
         assoc_num = 1
-        singles = []
+        singles = [c for c, single in zip(self.associations, is_single.tolist()) if single]
 
-        for cluster in self.associations:
-            size = len(cluster['features'])
+        for cluster, size in zip(self.associations, sizes.tolist()):
             if size == 1:
-                singles.append(cluster)
                 continue
 
             # Заголовок ассоциации
@@ -518,7 +636,6 @@ class MainWindow(QMainWindow):
                 "Открыть созданный документ Word?",
                 QMessageBox.Yes | QMessageBox.No
             ) == QMessageBox.Yes:
-                import os
                 os.startfile(fname)  # Windows
                 # Для других ОС можно использовать QDesktopServices.openUrl(QUrl.fromLocalFile(fname))
 
@@ -530,7 +647,8 @@ class MainWindow(QMainWindow):
             )
 
     def _on_close(self, event):
-        # Сохраняем перед закрытием
+        # Сохраняем перед закрытием (в том числе отложенное таймером)
+        self._settings_timer.stop()
         self._save_settings()
         event.accept()
 
@@ -586,14 +704,15 @@ class MainWindow(QMainWindow):
 
         COLUMNS = 3  # фиксированное количество столбцов
 
+        invalid = np.zeros(len(features), dtype=bool)
+        invalid[getattr(self.data, 'invalid_columns', [])] = True
+
         for i, col_name in enumerate(features):
             cb = QCheckBox(col_name)
             cb.setChecked(True)
 
             # ─── Подсветка и отключение проблемных признаков ───────────────
-            is_invalid = False
-            if hasattr(self.data, 'invalid_columns') and i in self.data.invalid_columns:
-                is_invalid = True
+            is_invalid = invalid[i]
 
             if is_invalid:
                 cb.setChecked(False)
@@ -663,39 +782,24 @@ class MainWindow(QMainWindow):
 
         self.stat_corr.clear()
         self.table_view.setModel(None)
+        self._data_model = None  # прежняя модель без родителя освобождается вместе со своей матрицей
 
         self.statusBar.showMessage("Загрузка файла... Подождите...")
 
         success = self.data.load_file(fname)
 
         if success:
-            # Заполняем таблицу данных
-            model = QStandardItemModel()
-            model.setHorizontalHeaderLabels(self.data.get_column_names())
-
-            for row_idx in range(self.data.get_count_record()):
-                for col_idx, col_name in enumerate(self.data.get_column_names()):
-                    val = self.data.df.iloc[row_idx, col_idx]
-                    if not pd.isna(val):
-                        try:
-                            # Проверяем, является ли значение числовым
-                            float_val = float(val)
-                            item = QStandardItem(f"{float_val:.4g}")
-                        except (ValueError, TypeError):
-                            # Если не число, используем строковое представление
-                            item = QStandardItem(str(val))
-                    else:
-                        item = QStandardItem("—")
-                    item.setEditable(False)
-                    model.setItem(row_idx, col_idx, item)
+            # Таблица данных — модель поверх матрицы, ячейки форматируются при отрисовке
+            # Модель без родителя: единственная ссылка — self._data_model, а не дочерний объект окна
+            self._data_model = NumpyTableModel(self.data.get_matrix(), self.data.get_column_names())
 
-            self.table_view.setModel(model)
+            self.table_view.setModel(self._data_model)
 
             # Заполняем чекбоксы в левой панели
             self.fill_features_list()
 
             self.statusBar.showMessage(
-                f"Файл загружен: {Path(fname).name}   •   строк: {self.data.get_count_record()}   •   признаков: {self.data.get_count_column()}"
+                f"Файл загружен: {self.data.filename_base}   •   строк: {self.data.get_count_record()}   •   признаков: {self.data.get_count_column()}"
             )
         else:
             QMessageBox.warning(self, "Ошибка загрузки",
@@ -729,31 +833,26 @@ class MainWindow(QMainWindow):
         self.stat_corr.initialize(selected_names)
 
         # Переносим информацию о невалидных столбцах (локальные индексы)
-        self.stat_corr.invalid_columns = [
-            local_idx for local_idx, global_idx in enumerate(selected_global)
-            if global_idx in self.data.invalid_columns
-        ]
+        self.stat_corr.invalid_columns = np.flatnonzero(
+            np.isin(selected_global, self.data.invalid_columns)
+        ).tolist()
 
         # Создаём все пары из выбранных столбцов (используем ЛОКАЛЬНЫЕ индексы 0..n-1)
-        num_selected = len(selected_global)
-        for i in range(num_selected - 1):
-            for j in range(i + 1, num_selected):
-                self.stat_corr.add_or_get_pair(i, j)  # ← ЛОКАЛЬНЫЕ i и j!
+        self.stat_corr.add_all_pairs()
 
         # Сообщение о начале расчёта
         self.statusBar.showMessage(f"Расчёт корреляций в режиме …")
 
-        # Адаптер для доступа к данным: локальный индекс → значение из исходных данных
-        def get_data_adapter(local_col: int, row: int) -> float:
-            global_col = selected_global[local_col]
-            return self.data.get_data(global_col, row)
+        # Данные выбранных столбцов: локальный индекс = номер столбца в матрице
+        selected_data = self.data.get_matrix()[:, selected_global]
+        selected_ranks = self.data.get_ranks()[:, selected_global]  # ранги считаются один раз на файл
 
         try:
             calculate_all_correlations(
                 stat_corr=self.stat_corr,
-                get_data=get_data_adapter,
-                num_records=self.data.get_count_record(),
-                percent10=10
+                X=selected_data,
+                percent10=10,
+                ranks=selected_ranks
             )
 
             pair_count = self.stat_corr.count()
@@ -772,8 +871,7 @@ class MainWindow(QMainWindow):
             )
 
         except Exception as e:
-            import traceback
-            traceback.print_exc()  # для отладки в консоль
+            logging.exception("Ошибка при расчёте корреляций")  # стек — в лог, а не в консоль
 
             QMessageBox.critical(
                 self,
@@ -792,7 +890,7 @@ class MainWindow(QMainWindow):
 
         html_content = self._generate_old_report()
 
-        report_path = Path(self.working_directory) / "mapcor_report.html"
+        report_path = self._working_dir_path / "mapcor_report.html"
         report_path.write_text(html_content, encoding="utf-8")
 
         QDesktopServices.openUrl(QUrl.fromLocalFile(str(report_path.absolute())))
@@ -802,10 +900,10 @@ class MainWindow(QMainWindow):
             QMessageBox.information(self, "Нет результатов", "Сначала выполните расчёт (F9).")
             return
 
-        html_content = self._generate_extended_report()
-
-        report_path = Path(self.working_directory) / "mapcor_extended_report.html"
-        report_path.write_text(html_content, encoding="utf-8")
+        # Отчёт пишется в файл по частям через буфер 1 МБ, без строки и bytes-копии целиком
+        report_path = self._working_dir_path / "mapcor_extended_report.html"
+        with open(report_path, 'w', encoding='utf-8', buffering=1 << 20) as fh:
+            self._generate_extended_report(fh.write)
 
         QDesktopServices.openUrl(QUrl.fromLocalFile(str(report_path.absolute())))
 
@@ -843,7 +941,6 @@ class MainWindow(QMainWindow):
         ]
         existing_desired = [c for c in desired_columns if c in stats_df.columns]
         stats_df = stats_df[existing_desired].copy()
-        import os
         tempfname = os.path.join(self._get_initial_dir(), "statistics.docx")
         # Диалог сохранения
         fname, _ = QFileDialog.getSaveFileName(
@@ -859,201 +956,19 @@ class MainWindow(QMainWindow):
         # Обновляем рабочую директорию на директорию сохраненного файла
         self.working_directory = os.path.dirname(fname)
 
-        try:
-            doc = Document()
-
-            # Настройка страницы A4
-            section = doc.sections[0]
-            section.page_width = Mm(210)
-            section.page_height = Mm(297)
-            section.left_margin = Mm(20)
-            section.right_margin = Mm(20)
-            section.top_margin = Mm(20)
-            section.bottom_margin = Mm(20)
-
-            # Заголовок
-            title = doc.add_paragraph("Статистический отчёт по признакам")
-            title.alignment = WD_ALIGN_PARAGRAPH.CENTER
-            run = title.runs[0]
-            run.font.name = 'Times New Roman'
-            run.font.size = Pt(16)
-            run.bold = True
+        # Ключ содержимого документа: значения, признаки, столбцы и строка-подзаголовок
+        docx_key = (tuple(stats_df.index), tuple(stats_df.columns), stats_df.to_numpy(dtype=float).tobytes(),
+                    self.data.filename_base, self.data.get_count_record())
 
-            # Подзаголовок
-            subtitle = doc.add_paragraph(
-                f"Файл: {Path(self.data.filename).name}   |   "
-                f"Записей: {self.data.get_count_record():,}   |   "
-                f"Признаков: {len(stats_df)}"
-            )
-            subtitle.alignment = WD_ALIGN_PARAGRAPH.CENTER
-            subtitle.runs[0].font.name = 'Times New Roman'
-            subtitle.runs[0].font.size = Pt(12)
-            subtitle.runs[0].font.color.rgb = RGBColor(80, 80, 80)
-
-            doc.add_paragraph()
-
-            # Таблица
-            table = doc.add_table(rows=1, cols=len(stats_df.columns) + 1)
-            table.style = 'Table Grid'
-            table.autofit = False
-            table.allow_autofit = False
-
-            # Заголовки
-            hdr_cells = table.rows[0].cells
-            hdr_cells[0].text = 'Хар-ка'
-
-            header_names = {               
-                'repeating_min_percent': 'BLS, %',
-                'min': 'Min',
-                'max': 'Max',
-                'mean': 'Mean',
-                'median': 'Med',
-                'std': 'Std',
-                'CV_percent': 'V, %',
-                'J': 'J'
-            }
-
-            for i, col in enumerate(stats_df.columns, 1):
-                hdr_cells[i].text = header_names.get(col, col)
-                hdr_cells[i].paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.CENTER
-                for run in hdr_cells[i].paragraphs[0].runs:
-                    run.font.name = 'Times New Roman'
-                    run.font.size = Pt(14)
-
-                        # Данные + форматирование
-            for row_idx, (feature, row) in enumerate(stats_df.iterrows()):
-                row_cells = table.add_row().cells
-                row_cells[0].text = feature
-                row_cells[0].paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.LEFT
-
-                for col_idx, col_name in enumerate(stats_df.columns, 1):
-                    val = row[col_name]
-                    if pd.isna(val):
-                        val_str = "—"
-                    elif col_name in ['min', 'median', 'max', 'mean', 'std']:
-                        val_str = f"{val:g}"
-                    elif col_name in ['repeating_min_percent', 'CV_percent']:
-                        val_str = f"{val:g}"
-                    elif col_name == 'J':
-                        val_str = f"{val:g}"
-                    else:
-                        val_str = str(val)
-
-                    cell = row_cells[col_idx]
-                    cell.text = val_str
-                    cell.paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.RIGHT
-
-                    for run in cell.paragraphs[0].runs:
-                        run.font.name = 'Times New Roman'
-                        run.font.size = Pt(14)
-
-            # Применяем жирный курсив ко всему столбцу «Признак» (индекс 0)
-            for row in table.rows:
-                cell = row.cells[0]
-                for p in cell.paragraphs:
-                    for run in p.runs:
-                        run.bold = True
-                        run.italic = True
-
-            # Применяем жирный курсив ко всей строке заголовков (индекс 0)
-            for cell in table.rows[0].cells:
-                for p in cell.paragraphs:
-                    for run in p.runs:
-                        run.bold = True
-                        run.italic = True
-
-            # Ширина столбцов
-            table.columns[0].width = Mm(48)  # шире для Признака
-            for i in range(1, len(table.columns)):
-                table.columns[i].width = Mm(16)
-
-            # Повтор шапки
-            from docx.oxml import OxmlElement
-            from docx.oxml.ns import qn
-
-            trPr = table.rows[0]._tr.get_or_add_trPr()
-            tblHeader = OxmlElement('w:tblHeader')
-            tblHeader.set(qn('w:val'), 'true')
-            trPr.append(tblHeader)
-
-            # Легенда
-            doc.add_paragraph()
-            legend_title = doc.add_paragraph("Расшифровка показателей")
-            legend_title.runs[0].font.name = 'Times New Roman'
-            legend_title.runs[0].font.size = Pt(14)
-            legend_title.runs[0].bold = True
-
-            legend_items = [
-                "BLS, % — доля значений ниже чувствительности",
-                "Min — минимальное значение",
-                "Max — максимальное значение",
-                "Mean — матожидание",
-                "Med — медиана",
-                "Std — стандартное отклонение",
-                "V, % — коэффициент вариации (станд. отклон. / |mean| × 100)",
-                "J  — нормированная энтропия Шеннона (6 интервалов)\n"
-                "   · J ≈ 0 — почти все значения в одном интервале\n"
-                "   · J ≈ 1 — равномерное распределение\n"
-                "   · Порог однородности: J ≥ 0.65"
-            ]
-
-            for item in legend_items:
-                # Разбиваем элемент на строки по символу новой строки
-                lines = item.split('\n')
-                first_line = lines[0].rstrip()  # убираем лишние пробелы справа
-                
-                # Обрабатываем первую строку с разделителем " — "
-                if " — " in first_line:
-                    short_name, description = first_line.split(" — ", 1)
-                    
-                    # Создаём абзац со стилем маркированного списка
-                    p = doc.add_paragraph(style='List Bullet')
-                    
-                    # Часть 1: краткое название — жирный курсив
-                    run1 = p.add_run(short_name)
-                    run1.bold = True
-                    run1.italic = True
-                    run1.font.name = 'Times New Roman'
-                    run1.font.size = Pt(12)
-                    run1.font.element.rPr.rFonts.set(qn('w:eastAsia'), 'Times New Roman')  # для кириллицы
-                    
-                    # Часть 2: разделитель " — " — обычный курсив
-                    run2 = p.add_run(" — ")
-                    run2.italic = True
-                    run2.font.name = 'Times New Roman'
-                    run2.font.size = Pt(12)
-                    run2.font.element.rPr.rFonts.set(qn('w:eastAsia'), 'Times New Roman')
-                    
-                    # Часть 3: описание — обычный курсив
-                    run3 = p.add_run(description)
-                    run3.italic = True
-                    run3.font.name = 'Times New Roman'
-                    run3.font.size = Pt(12)
-                    run3.font.element.rPr.rFonts.set(qn('w:eastAsia'), 'Times New Roman')
-                else:
-                    # Если нет разделителя — весь текст курсивом
-                    p = doc.add_paragraph(first_line, style='List Bullet')
-                    for run in p.runs:
-                        run.italic = True
-                        run.font.name = 'Times New Roman'
-                        run.font.size = Pt(12)
-                        run.font.element.rPr.rFonts.set(qn('w:eastAsia'), 'Times New Roman')
-                
-                # Обрабатываем дополнительные строки (подпункты) с отступом
-                for extra_line in lines[1:]:
-                    extra_line = extra_line.strip()
-                    if extra_line:  # пропускаем пустые строки
-                        p_extra = doc.add_paragraph(extra_line)
-                        p_extra.paragraph_format.left_indent = Pt(20)  # отступ слева
-                        
-                        # Весь текст подпункта — курсивом
-                        for run in p_extra.runs:
-                            run.italic = True
-                            run.font.name = 'Times New Roman'
-                            run.font.size = Pt(12)
-                            run.font.element.rPr.rFonts.set(qn('w:eastAsia'), 'Times New Roman')
+        try:
+            # Та же статистика уже собиралась — пишем сохранённые байты документа вместо повторной
+            # сборки (не копию прежнего файла: его могли изменить после сохранения)
+            if docx_key != self._last_stats_docx_key:
+                self._last_stats_docx_bytes = self._build_stats_docx(stats_df)
+                self._last_stats_docx_key = docx_key
+            with open(fname, 'wb') as f:
+                f.write(self._last_stats_docx_bytes)
 
-            doc.save(fname)
             QMessageBox.information(self, "Сохранено", f"Отчёт сохранён:\n{fname}")
 
             # Опционально: открыть файл
@@ -1062,76 +977,217 @@ class MainWindow(QMainWindow):
                 "Открыть созданный документ Word?",
                 QMessageBox.Yes | QMessageBox.No
             ) == QMessageBox.Yes:
-                import os
                 os.startfile(fname)  # Windows
 
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Не удалось сохранить:\n{str(e)}")
 
+    def _build_stats_docx(self, stats_df):
+        """Собирает документ Word со статистикой stats_df и возвращает содержимое .docx (bytes)"""
+        from docx import Document
+        from docx.shared import Mm, Pt, RGBColor
+        from docx.enum.text import WD_ALIGN_PARAGRAPH
+        from docx.enum.style import WD_STYLE_TYPE
+        from docx.oxml import OxmlElement, parse_xml
+        from docx.oxml.ns import qn, nsdecls
+        from xml.sax.saxutils import escape
+
+        doc = Document()
+
+        # Шрифты задаются стилями один раз, а не каждому run отдельно
+        style_body = doc.styles.add_style('MapCorBody', WD_STYLE_TYPE.PARAGRAPH)
+        style_body.base_style = doc.styles['Normal']
+        style_body.font.name = 'Times New Roman'
+        style_body.font.size = Pt(14)
+
+        style_header = doc.styles.add_style('MapCorHeader', WD_STYLE_TYPE.PARAGRAPH)
+        style_header.base_style = style_body
+        style_header.font.bold = True
+        style_header.font.italic = True
+
+        # Легенда — стиль символов: абзацы остаются 'List Bullet' / обычными
+        style_legend = doc.styles.add_style('MapCorLegend', WD_STYLE_TYPE.CHARACTER)
+        style_legend.font.name = 'Times New Roman'
+        style_legend.font.size = Pt(12)
+        style_legend.font.italic = True
+        style_legend.element.rPr.rFonts.set(qn('w:eastAsia'), 'Times New Roman')  # для кириллицы
+
+        # Настройка страницы A4
+        section = doc.sections[0]
+        section.page_width = Mm(210)
+        section.page_height = Mm(297)
+        section.left_margin = Mm(20)
+        section.right_margin = Mm(20)
+        section.top_margin = Mm(20)
+        section.bottom_margin = Mm(20)
+
+        # Заголовок
+        title = doc.add_paragraph("Статистический отчёт по признакам")
+        title.alignment = WD_ALIGN_PARAGRAPH.CENTER
+        run = title.runs[0]
+        run.font.name = 'Times New Roman'
+        run.font.size = Pt(16)
+        run.bold = True
+
+        # Подзаголовок
+        subtitle = doc.add_paragraph(
+            f"Файл: {self.data.filename_base}   |   "
+            f"Записей: {self.data.get_count_record():,}   |   "
+            f"Признаков: {len(stats_df)}"
+        )
+        subtitle.alignment = WD_ALIGN_PARAGRAPH.CENTER
+        subtitle.runs[0].font.name = 'Times New Roman'
+        subtitle.runs[0].font.size = Pt(12)
+        subtitle.runs[0].font.color.rgb = RGBColor(80, 80, 80)
+
+        doc.add_paragraph()
+
+        # Таблица
+        table = doc.add_table(rows=1, cols=len(stats_df.columns) + 1)
+        table.style = 'Table Grid'
+        table.autofit = False
+        table.allow_autofit = False
+
+        # Заголовки
+        hdr_cells = table.rows[0].cells
+        hdr_cells[0].text = 'Хар-ка'
+
+        header_names = {               
+            'repeating_min_percent': 'BLS, %',
+            'min': 'Min',
+            'max': 'Max',
+            'mean': 'Mean',
+            'median': 'Med',
+            'std': 'Std',
+            'CV_percent': 'V, %',
+            'J': 'J'
+        }
+
+        for i, col in enumerate(stats_df.columns, 1):
+            hdr_cells[i].text = header_names.get(col, col)
+            hdr_cells[i].paragraphs[0].style = style_header
+            hdr_cells[i].paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.CENTER
+
+        # Данные + форматирование: строки собираются в XML и разбираются один раз —
+        # add_row()/cells python-docx перебирают всю таблицу на каждой ячейке
+        tc_pr = f'<w:tcPr><w:tcW w:type="dxa" w:w="{hdr_cells[0].width.twips}"/></w:tcPr>'
+        feature_tc = (f'<w:tc>{tc_pr}<w:p><w:pPr><w:jc w:val="left"/></w:pPr>'
+                      '<w:r><w:rPr><w:b/><w:i/></w:rPr><w:t{space}>{text}</w:t></w:r></w:p></w:tc>')  # жирный курсив
+        value_tc = (f'<w:tc>{tc_pr}<w:p><w:pPr><w:pStyle w:val="{style_body.style_id}"/><w:jc w:val="right"/>'
+                    '</w:pPr><w:r><w:t>{text}</w:t></w:r></w:p></w:tc>')
+
+        # Значения — одна матрица вместо Series на строку iterrows
+        values = stats_df.to_numpy(dtype=float)
+        nan_mask = np.isnan(values).tolist()
+        row_chunks = []
+        for feature, row_vals, row_nan in zip(stats_df.index.tolist(), values.tolist(), nan_mask):
+            feature = str(feature)
+            space = ' xml:space="preserve"' if feature != feature.strip() else ''
+            row_chunks.append('<w:tr>')
+            row_chunks.append(feature_tc.format(space=space, text=escape(feature)))
+            for val, is_nan in zip(row_vals, row_nan):
+                row_chunks.append(value_tc.format(text="—" if is_nan else f"{val:g}"))
+            row_chunks.append('</w:tr>')
+        rows_xml = parse_xml(f'<w:tbl {nsdecls("w")}>' + ''.join(row_chunks) + '</w:tbl>')
+        table._tbl.extend(list(rows_xml))
+
+        # Жирный курсив для «Хар-ка» (шрифт — как у столбца признаков), остальная шапка — style_header
+        for run in hdr_cells[0].paragraphs[0].runs:
+            run.bold = True
+            run.italic = True
+
+        # Ширина столбцов — одним элементом <w:tblGrid>, первый шире (для Признака)
+        col_widths = [Mm(48).twips] + [Mm(16).twips] * len(stats_df.columns)
+        tbl_grid = parse_xml(f'<w:tblGrid {nsdecls("w")}>' +
+                             ''.join(f'<w:gridCol w:w="{w}"/>' for w in col_widths) + '</w:tblGrid>')
+        table._tbl.replace(table._tbl.tblGrid, tbl_grid)
+
+        # Повтор шапки
+        trPr = table.rows[0]._tr.get_or_add_trPr()
+        tblHeader = OxmlElement('w:tblHeader')
+        tblHeader.set(qn('w:val'), 'true')
+        trPr.append(tblHeader)
+
+        # Легенда
+        doc.add_paragraph()
+        legend_title = doc.add_paragraph("Расшифровка показателей", style=style_body)
+        legend_title.runs[0].bold = True
+
+        legend_items = [
+            "BLS, % — доля значений ниже чувствительности",
+            "Min — минимальное значение",
+            "Max — максимальное значение",
+            "Mean — матожидание",
+            "Med — медиана",
+            "Std — стандартное отклонение",
+            "V, % — коэффициент вариации (станд. отклон. / |mean| × 100)",
+            "J  — нормированная энтропия Шеннона (6 интервалов)\n"
+            "   · J ≈ 0 — почти все значения в одном интервале\n"
+            "   · J ≈ 1 — равномерное распределение\n"
+            "   · Порог однородности: J ≥ 0.65"
+        ]
+
+        # Абзацы легенды — готовые XML-шаблоны (стиль символов MapCorLegend), один разбор на всю легенду
+        legend_run = ('<w:r><w:rPr><w:rStyle w:val="' + style_legend.style_id + '"/>{bold}</w:rPr>'
+                      '<w:t xml:space="preserve">{text}</w:t></w:r>')
+        bullet_p = '<w:p><w:pPr><w:pStyle w:val="' + doc.styles['List Bullet'].style_id + '"/></w:pPr>{runs}</w:p>'
+        extra_p = f'<w:p><w:pPr><w:ind w:left="{Pt(20).twips}"/></w:pPr>{{runs}}</w:p>'  # отступ слева
+
+        legend_chunks = []
+        for item in legend_items:
+            # Разбиваем элемент на строки по символу новой строки
+            lines = item.split('\n')
+            first_line = lines[0].rstrip()  # убираем лишние пробелы справа
+
+            # Первая строка с разделителем " — ": краткое название — жирный курсив,
+            # разделитель и описание — обычный курсив; без разделителя — весь текст курсивом
+            if " — " in first_line:
+                short_name, description = first_line.split(" — ", 1)
+                runs = (legend_run.format(bold='<w:b/>', text=escape(short_name)) +
+                        legend_run.format(bold='', text=" — ") +
+                        legend_run.format(bold='', text=escape(description)))
+            else:
+                runs = legend_run.format(bold='', text=escape(first_line))
+            legend_chunks.append(bullet_p.format(runs=runs))
+
+            # Дополнительные строки (подпункты) с отступом, весь текст — курсивом
+            for extra_line in lines[1:]:
+                extra_line = extra_line.strip()
+                if extra_line:  # пропускаем пустые строки
+                    legend_chunks.append(extra_p.format(runs=legend_run.format(bold='', text=escape(extra_line))))
+
+        legend_xml = parse_xml(f'<w:body {nsdecls("w")}>' + ''.join(legend_chunks) + '</w:body>')
+        sect_pr = doc.element.body.sectPr  # абзацы вставляются перед свойствами раздела, как add_paragraph
+        for p in list(legend_xml):
+            sect_pr.addprevious(p)
 
-    def _prepare_html_for_pandoc(self, html_content):
+        buf = io.BytesIO()
+        doc.save(buf)
+        return buf.getvalue()
+
+
+    def _generate_extended_report(self, write=None):
         """
-        Более агрессивный подход: заменяем стили на старые HTML-атрибуты
+        Генерация расширенного HTML-отчёта — версия с крупным названием и полусерым диагональным текстом.
+        write — функция записи (например, fh.write открытого файла): HTML пишется в неё по частям
+        и не собирается в памяти целиком. Без write отчёт возвращается строкой.
         """
-        import re
-        from bs4 import BeautifulSoup
-        
-        soup = BeautifulSoup(html_content, 'html.parser')
-        
-        # Обрабатываем все ячейки с цветным фоном
-        for cell in soup.find_all(['td', 'th']):
-            # Проверяем inline style
-            if cell.has_attr('style'):
-                style = cell['style']
-                
-                # Извлекаем hex-цвет
-                match = re.search(r'background(?:-color)?:\s*#([0-9a-fA-F]{6})', style)
-                if match:
-                    hex_color = match.group(1)
-                    
-                    # Конвертируем в RGB для Word
-                    r = int(hex_color[0:2], 16)
-                    g = int(hex_color[2:4], 16)
-                    b = int(hex_color[4:6], 16)
-                    
-                    # Используем bgcolor (старый HTML атрибут, который Pandoc понимает лучше)
-                    cell['bgcolor'] = f"#{hex_color}"
-                    
-                    # Также оборачиваем содержимое в span с цветом
-                    content = cell.decode_contents()
-                    cell.clear()
-                    new_span = soup.new_tag('span', style=f'background-color:#{hex_color};display:block;padding:2px;')
-                    new_span.append(BeautifulSoup(content, 'html.parser'))
-                    cell.append(new_span)
-            
-            # Обрабатываем классы
-            if cell.has_attr('class'):
-                classes = cell['class']
-                
-                if 'diag' in classes:
-                    cell['bgcolor'] = '#e8e8e8'
-                elif 'diag-header' in classes:
-                    cell['bgcolor'] = '#b3e0ff'
-                elif 'row-header' in classes:
-                    cell['bgcolor'] = '#f0f4ff'
-        
-        return str(soup)
+        buf = None
+        if write is None:
+            buf = io.StringIO()
+            write = buf.write
+        out = write
 
-
-    def _generate_extended_report(self):
-        """Генерация расширенного HTML-отчёта — версия с крупным названием и полусерым диагональным текстом"""
-        
         # Шаг 1: Получаем список индексов признаков из self.stat_corr
         num_features = len(self.stat_corr.column_names)
         if num_features < 2:
-            return "<html><body><h2>Ошибка: выберите хотя бы 2 валидных признака</h2></body></html>"
+            out("<html><body><h2>Ошибка: выберите хотя бы 2 валидных признака</h2></body></html>")
+            return buf.getvalue() if buf is not None else None
 
         selected_indices = list(range(num_features))  # Индексы 0..num_features-1, соответствующие self.stat_corr.column_names
 
-        BLOCK_SIZE = 8
-
         # Шаг 2: HTML-заголовок и стили (обновлены размеры и цвета для ch10-стиля)
-        lines = [
+        header = [
             "<!DOCTYPE html>",
             "<html lang='ru'>",
             "<head>",
@@ -1166,125 +1222,149 @@ class MainWindow(QMainWindow):
             "    .row-header {background: #f0f4ff; font-weight: bold; text-align: left; min-width: 60px;}",
             "    td.num {font-family: Consolas, 'Courier New', monospace;-webkit-print-color-adjust: exact; color-adjust: exact;}",
             "    hr {border: 0; height: 1px; background: #ddd; margin: 2.4em 0;}",
+            *COLOR_CSS_LINES,
             "  </style>",
             "</head>",
             "<body>",
             "<h1>Корреляционный анализ</h1>",
             f"<p align='center' style='font-size:1.25em; margin-bottom:2.2em;'>",
             f"<b>Программа:</b> MapCor ;  ",
-            f"<b>Файл:</b> {Path(self.data.filename).name} ;  ",
+            f"<b>Файл:</b> {self.data.filename_base} ;  ",
             f"<b>Число объектов:</b> {self.data.get_count_record()} ;  ",
             f"<b>Число характеристик:</b> {num_features} ;  ",
             
             
         ]
+        out('\n'.join(header))
+        out('\n')
 
         # Шаг 3: Общая статистика — первая
-        lines.append('    <h2>Общая статистика по всем выбранным парам</h2>')
-        lines.append('    <table style="width:72%; max-width:950px;">')
-        lines.append('      <tr><th>Показатель</th><th>Минимум</th><th>Максимум</th><th>Среднее</th></tr>')
+        out('    <h2>Общая статистика по всем выбранным парам</h2>\n')
+        out('    <table style="width:72%; max-width:950px;">\n')
+        out('      <tr><th>Показатель</th><th>Минимум</th><th>Максимум</th><th>Среднее</th></tr>\n')
         corr_stat = self.stat_corr.all_pairs_stat['corr']
-        lines.append(f'      <tr><td><b>R</b></td><td>{corr_stat.min:.3f}</td><td>{corr_stat.max:.3f}</td><td>{corr_stat.mean:.3f}</td></tr>')
+        out(f'      <tr><td><b>R</b></td><td>{corr_stat.min:.3f}</td><td>{corr_stat.max:.3f}</td><td>{corr_stat.mean:.3f}</td></tr>\n')
         #dist10_stat = self.stat_corr.all_pairs_stat['dist10']
-        #lines.append(f'      <tr><td><b>DIST_10</b></td><td>{dist10_stat.min:.1f}</td><td>{dist10_stat.max:.1f}</td><td>{dist10_stat.mean:.1f}</td></tr>')
+        #out(f'      <tr><td><b>DIST_10</b></td><td>{dist10_stat.min:.1f}</td><td>{dist10_stat.max:.1f}</td><td>{dist10_stat.mean:.1f}</td></tr>\n')
         rr_stat = self.stat_corr.all_pairs_stat['rr']
-        lines.append(f'      <tr><td><b>RR</b></td><td>{rr_stat.min:.3f}</td><td>{rr_stat.max:.3f}</td><td>{rr_stat.mean:.3f}</td></tr>')
-        lines.append('    </table>')
-        lines.append('<p style="text-align:center; color:#555; font-size:1.05em; margin: 0.8em 0 2em 0;">')
-        lines.append('<b>R</b> — коэффициент ранговой корреляции<br> <b>RR</b> — корреляция корреляций')
-        lines.append('</p>')
+        out(f'      <tr><td><b>RR</b></td><td>{rr_stat.min:.3f}</td><td>{rr_stat.max:.3f}</td><td>{rr_stat.mean:.3f}</td></tr>\n')
+        out('    </table>\n')
+        out('<p style="text-align:center; color:#555; font-size:1.05em; margin: 0.8em 0 2em 0;">\n')
+        out('<b>R</b> — коэффициент ранговой корреляции<br> <b>RR</b> — корреляция корреляций\n')
+        out('</p>\n')
 
-        #lines.append('    <hr>')
+        #out('    <hr>\n')
+
+        # Индексы пар F×F одной таблицей вместо get_pair_index (поиск по списку) на каждую ячейку
+        pair_mat = pair_index_table(self.stat_corr)
+        # Матрицы R/RR F×F — один раз на отчёт, строка признака берётся из них
+        corr_mat = pair_value_matrix(self.stat_corr.corr, pair_mat)
+        rr_mat = pair_value_matrix(self.stat_corr.rr, pair_mat)
 
         # Шаг 4: Таблицы по каждой характеристике
+        names = tuple(self.stat_corr.column_names)  # снимок имён — индексация без вызова метода
         for feature_idx in selected_indices:
-            feature_name = self.stat_corr.get_column_name(feature_idx)
-            fs = self.stat_corr.feature_stats[feature_idx]
-
-            # Одна строка над таблицей: крупное имя + маленькая статистика
-            lines.append(
-                '    <div class="feature-caption">'
-                f'<span class="name">{feature_name}</span>  '
-                f'<span class="stats">'
-                f'M(R) = {fs.avg_corr:.3f} ;  '
-                #f'M(DIST10) = {fs.avg_dist10:.1f} ;  '
-                f'M(RR) = {fs.avg_rr:.3f}'
-                f'</span>'
-                '</div>'
-            )
+            out(self._render_feature_block(feature_idx, selected_indices, pair_mat, names, corr_mat, rr_mat))
 
-            # Блочные таблицы
-            block_start = 0
-            while block_start < len(selected_indices):
-                block_end = min(block_start + BLOCK_SIZE - 1, len(selected_indices) - 1)
+        out('  </body></html>')
+        return buf.getvalue() if buf is not None else None
+
+    def _render_feature_block(self, feature_idx, selected_indices, pair_mat, names, corr_mat, rr_mat):
+        """
+        HTML-блок расширенного отчёта для одного признака: подпись и блочные таблицы R/RR.
+        names — кортеж имён признаков stat_corr, corr_mat / rr_mat — матрицы из pair_value_matrix.
+        """
+        BLOCK_SIZE = 8
 
-                lines.append('    <table>')
-                lines.append('      <tr><th class="row-header"></th>')
+        buf = io.StringIO()
+        out = buf.write
+
+        feature_name = names[feature_idx]
+        fs = self.stat_corr.feature_stats[feature_idx]
+
+        # Значения R/RR и классы их цветов для всей строки признака — один векторный расчёт
+        corr_row = corr_mat[feature_idx]
+        rr_row = rr_mat[feature_idx]
+        corr_row_bins = get_color_indices(corr_row, -1.0, 1.0).tolist()
+        rr_row_bins = get_color_indices(rr_row, -1.0, 1.0).tolist()
+        pair_row = pair_mat[feature_idx].tolist()
+
+        # Одна строка над таблицей: крупное имя + маленькая статистика
+        out(
+            '<div class="feature-caption">'
+            f'<span class="name">{feature_name}</span>  '
+            f'<span class="stats">'
+            f'M(R) = {fs.avg_corr:.3f} ;  '
+            #f'M(DIST10) = {fs.avg_dist10:.1f} ;  '
+            f'M(RR) = {fs.avg_rr:.3f}'
+            f'</span>'
+            '</div>\n'
+        )
 
-                # Заголовки столбцов — диагональ выделена сильнее
-                for j in range(block_start, block_end + 1):
-                    col_name = self.stat_corr.get_column_name(selected_indices[j])
-                    if selected_indices[j] == feature_idx:
-                        lines.append(f'        <th class="diag-header">{col_name}</th>')
-                    else:
-                        lines.append(f'        <th>{col_name}</th>')
-                lines.append('      </tr>')
-
-                # R
-                lines.append('      <tr><td class="row-header"><b>R</b></td>')
-                for j in range(block_start, block_end + 1):
-                    other_idx = selected_indices[j]
-                    if feature_idx == other_idx:
-                        lines.append('        <td class="diag">1.000</td>')
-                    else:
-                        pair_idx = self.stat_corr.get_pair_index(feature_idx, other_idx)
-                        if pair_idx >= 0:
-                            val = self.stat_corr.get_corr(pair_idx)
-                            color = get_color_for_r(val)
-                            lines.append(f'        <td style="background:{color};" class="num">{val:.3f}</td>')
-                        else:
-                            lines.append('        <td class="na">—</td>')
-                lines.append('      </tr>')
-
-                # DIST_10
-               # lines.append('      <tr><td class="row-header"><b>DIST_10</b></td>')
-               # for j in range(block_start, block_end + 1):
-               #     other_idx = selected_indices[j]
-               #     if feature_idx == other_idx:
-               #         lines.append('        <td class="diag">100</td>')
-               #     else:
-               #         pair_idx = self.stat_corr.get_pair_index(feature_idx, other_idx)
-               #         if pair_idx >= 0:
-               #             val = self.stat_corr.get_dist10(pair_idx)
-               #             color = get_color_for_dist10(val)
-               #             lines.append(f'        <td style="background:{color};" class="num">{val:.1f}</td>')
-               #         else:
-               #             lines.append('        <td class="na">—</td>')
-               # lines.append('      </tr>')
-
-                # RR
-                lines.append('      <tr><td class="row-header"><b>RR</b></td>')
-                for j in range(block_start, block_end + 1):
-                    other_idx = selected_indices[j]
-                    if feature_idx == other_idx:
-                        lines.append('        <td class="diag">—</td>')
-                    else:
-                        pair_idx = self.stat_corr.get_pair_index(feature_idx, other_idx)
-                        if pair_idx >= 0:
-                            val = self.stat_corr.get_rr(pair_idx)
-                            color = get_color_for_rr(val)
-                            lines.append(f'        <td style="background:{color};" class="num">{val:.3f}</td>')
-                        else:
-                            lines.append('        <td class="na">—</td>')
-                lines.append('      </tr>')
+        # Блочные таблицы: строка таблицы — одна строка HTML, ячейки без отступов и переводов строк
+        block_start = 0
+        while block_start < len(selected_indices):
+            block_end = min(block_start + BLOCK_SIZE - 1, len(selected_indices) - 1)
 
-                lines.append('    </table>')
-                block_start = block_end + 1
+            # Имена и индексы пар блока — один раз на блок, общие для строк R и RR
+            block_indices = selected_indices[block_start:block_end + 1]
+            col_names = [names[other_idx] for other_idx in block_indices]
+            pair_idxs = [pair_row[other_idx] for other_idx in block_indices]
 
-            lines.append('    <hr>')
+            out('<table>\n')
+            out('<tr><th class="row-header"></th>')
 
-        lines.append('  </body></html>')
-        return '\n'.join(lines)
+            # Заголовки столбцов — диагональ выделена сильнее
+            for other_idx, col_name in zip(block_indices, col_names):
+                if other_idx == feature_idx:
+                    out(f'<th class="diag-header">{col_name}</th>')
+                else:
+                    out(f'<th>{col_name}</th>')
+            out('</tr>\n')
+
+            # R
+            out('<tr><td class="row-header"><b>R</b></td>')
+            for other_idx, pair_idx in zip(block_indices, pair_idxs):
+                if feature_idx == other_idx:
+                    out('<td class="diag">1.000</td>')
+                elif pair_idx >= 0:
+                    out(_TD_NUM(c=corr_row_bins[other_idx], v=corr_row[other_idx]))
+                else:
+                    out(_TD_NA)
+            out('</tr>\n')
+
+            # DIST_10
+           # out('<tr><td class="row-header"><b>DIST_10</b></td>')
+           # for j in range(block_start, block_end + 1):
+           #     other_idx = selected_indices[j]
+           #     if feature_idx == other_idx:
+           #         out('<td class="diag">100</td>')
+           #     else:
+           #         pair_idx = self.stat_corr.get_pair_index(feature_idx, other_idx)
+           #         if pair_idx >= 0:
+           #             val = self.stat_corr.get_dist10(pair_idx)
+           #             color = get_color_for_dist10(val)
+           #             out(f'<td style="background:{color};" class="num">{val:.1f}</td>')
+           #         else:
+           #             out('<td class="na">—</td>')
+           # out('</tr>\n')
+
+            # RR
+            out('<tr><td class="row-header"><b>RR</b></td>')
+            for other_idx, pair_idx in zip(block_indices, pair_idxs):
+                if feature_idx == other_idx:
+                    out('<td class="diag">—</td>')
+                elif pair_idx >= 0:
+                    out(_TD_NUM(c=rr_row_bins[other_idx], v=rr_row[other_idx]))
+                else:
+                    out(_TD_NA)
+            out('</tr>\n')
+
+            out('</table>\n')
+            block_start = block_end + 1
+
+        out('<hr>\n')
+        return buf.getvalue()
 
     def _generate_old_report(self):
         """
@@ -1331,7 +1411,7 @@ class MainWindow(QMainWindow):
             "<body>",
             "<h1>Матрица корреляций Спирмена и DIST₁₀</h1>",
             f"<p style='text-align:center; font-size:1.25em; margin-bottom:2.2em;'>",
-            f"<b>Файл:</b> {Path(self.data.filename).name} ;  ",
+            f"<b>Файл:</b> {self.data.filename_base} ;  ",
             f"<b>Записей:</b> {self.data.get_count_record()} ;  ",
             f"<b>Признаков в расчёте:</b> {len(selected_indices)} ;  ",
             f"<b>Пар:</b> {self.stat_corr.count()}",
@@ -1358,47 +1438,58 @@ class MainWindow(QMainWindow):
         lines.append('Выше диагонали — <b>R (Spearman)</b><br>Ниже диагонали — <b>DIST₁₀</b>')
         lines.append('</p>')
 
+        # Цвета всех пар — один векторный расчёт на показатель
+        corr_colors = get_colors(self.stat_corr.corr, -1.0, 1.0)
+        dist10_colors = get_colors(self.stat_corr.dist10, 0.0, 100.0)
+
+        # Индексы пар F×F одной таблицей вместо get_pair_index (поиск по списку) на каждую ячейку
+        pair_mat = pair_index_table(self.stat_corr)
+        names = tuple(self.stat_corr.column_names)
+        corr_values = self.stat_corr.corr
+        dist10_values = self.stat_corr.dist10
+
         # Основная матрица
         lines.append('<table style="margin: 0 auto 4em auto;">')
 
-        # Заголовочная строка
-        lines.append('  <tr>')
-        lines.append('    <th class="row-header"></th>')
+        # Заголовочная строка — одна строка HTML
+        header_cells = ['<tr><th class="row-header"></th>']
         for col_idx in selected_indices:
-            col_name = self.stat_corr.get_column_name(col_idx)
-            lines.append(f'    <th title="{col_name}">{col_name}</th>')
-        lines.append('  </tr>')
+            col_name = names[col_idx]
+            header_cells.append(f'<th title="{col_name}">{col_name}</th>')
+        header_cells.append('</tr>')
+        lines.append(''.join(header_cells))
 
-        # Строки матрицы
+        # Строки матрицы: строка таблицы — одна строка HTML, ячейки без отступов
         for row_i, row_idx in enumerate(selected_indices):
-            row_name = self.stat_corr.get_column_name(row_idx)
-            lines.append('  <tr>')
-            lines.append(f'    <td class="row-header">{row_name}</td>')
+            row_name = names[row_idx]
+            cells = [f'<tr><td class="row-header">{row_name}</td>']
+            pair_row = pair_mat[row_idx].tolist()
 
             for col_j, col_idx in enumerate(selected_indices):
                 if row_i == col_j:
                     # Диагональ — всегда 1.000 для R
-                    lines.append('    <td class="diag">1.000</td>')
+                    cells.append('<td class="diag">1.000</td>')
                 elif row_i < col_j:
                     # Выше диагонали → Spearman R
-                    pair_idx = self.stat_corr.get_pair_index(row_idx, col_idx)
+                    pair_idx = pair_row[col_idx]
                     if pair_idx >= 0:
-                        val = self.stat_corr.get_corr(pair_idx)
-                        color = get_color_for_r(val)
-                        lines.append(f'    <td style="background:{color};" class="num">{val:.3f}</td>')
+                        val = corr_values[pair_idx]
+                        color = corr_colors[pair_idx]
+                        cells.append(f'<td style="background:{color};" class="num">{val:.3f}</td>')
                     else:
-                        lines.append('    <td class="na">—</td>')
+                        cells.append(_TD_NA)
                 else:
                     # Ниже диагонали → DIST10
-                    pair_idx = self.stat_corr.get_pair_index(row_idx, col_idx)
+                    pair_idx = pair_row[col_idx]
                     if pair_idx >= 0:
-                        val = self.stat_corr.get_dist10(pair_idx)
-                        color = get_color_for_dist10(val)
-                        lines.append(f'    <td style="background:{color};" class="num">{val:.1f}</td>')
+                        val = dist10_values[pair_idx]
+                        color = dist10_colors[pair_idx]
+                        cells.append(f'<td style="background:{color};" class="num">{val:.1f}</td>')
                     else:
-                        lines.append('    <td class="na">—</td>')
+                        cells.append(_TD_NA)
 
-            lines.append('  </tr>')
+            cells.append('</tr>')
+            lines.append(''.join(cells))
 
         lines.append('</table>')
         lines.append('<hr style="margin: 4em 0 2em 0;">')
@@ -1406,94 +1497,66 @@ class MainWindow(QMainWindow):
         lines.append('  </body></html>')
         return '\n'.join(lines)
 
-    def _generate_stats_report(self, selected_columns=None):
+    def _generate_stats_report(self, selected_columns=None, write=None):
         """
         Генерирует HTML-отчёт по статистике признаков.
         Подсветка заголовков убрана, добавлена возможность включать/выключать столбцы и пункты легенды.
+        write — функция записи (например, fh.write открытого файла): HTML пишется в неё по частям
+        и не собирается в памяти целиком. Без write отчёт возвращается строкой.
         """
+        parts = self._iter_stats_report(selected_columns)
+        if write is None:
+            return "".join(parts)
+        for part in parts:
+            write(part)
+
+    def _iter_stats_report(self, selected_columns=None):
+        """HTML-отчёт по статистике (_generate_stats_report) частями: шапка, каждая таблица, легенда"""
         if self.data.df is None or self.data.df.empty:
-            return "<h2 style='text-align:center;color:#c53030;'>Нет загруженных данных</h2>"
+            yield "<h2 style='text-align:center;color:#c53030;'>Нет загруженных данных</h2>"
+            return
 
         stats_df = self.data.get_full_statistics()
         if stats_df is None or stats_df.empty:
-            return "<h2 style='text-align:center;color:#c53030;'>Нет числовых признаков</h2>"
-
-        # ────────────────────────────────────────────────────────────────
-        # Настройки: какие столбцы показывать в таблице
-        # ────────────────────────────────────────────────────────────────
-        SHOW_COLUMNS = {
-            'count'                  : False,
-            'nan_percent'            : False,
-            'min'                    : True,
-            'repeating_min_percent'  : True,
-            'below_lod_percent'      : False,
-            'zero_percent'           : False,
-            '5%'                     : False,
-            'Q1'                     : False,
-            'median'                 : True,
-            'Q3'                     : False,
-            '95%'                    : False,
-            'max'                    : True,
-            'mean'                   : True,
-            'std'                    : True,
-            'CV_percent'             : True,
-            'variance'               : False,
-            'skew'                   : False,   # скрыт по умолчанию
-            'kurtosis'               : False,  # скрыт по умолчанию
-            'unique_count'           : False,
-            'J'                      : True,
-        }
-
-        # ────────────────────────────────────────────────────────────────
-        # Настройки: какие пункты показывать в легенде
-        # ────────────────────────────────────────────────────────────────
-        SHOW_LEGEND_ITEMS = {
-            'count'                  : False,
-            'nan_percent'            : False,
-            'min_max'                : True,
-            'repeating_min_percent'  : True,
-            'below_lod_percent'      : False,
-            'zero_percent'           : False,
-            'percentiles'            : False,
-            'quartiles_median'       : False,
-            'mean_std'               : True,
-            'CV_percent'             : True,
-            'variance'               : False,
-            'skew_kurtosis'          : False,
-            'unique_count'           : False,
-            'J'                      : True,
-        }
+            yield "<h2 style='text-align:center;color:#c53030;'>Нет числовых признаков</h2>"
+            return
 
-        # Фильтруем столбцы, которые хотим показать
-        columns_to_show = [col for col in stats_df.columns if SHOW_COLUMNS.get(col, False)]
+        # Фильтруем столбцы, которые хотим показать (get_full_statistics уже вернула копию)
+        columns_to_show = [col for col in VISIBLE_STATS_COLUMNS if col in stats_df.columns]
         if not columns_to_show:
-            return "<h2 style='text-align:center;color:#c53030;'>Нет выбранных для отображения статистик</h2>"
+            yield "<h2 style='text-align:center;color:#c53030;'>Нет выбранных для отображения статистик</h2>"
+            return
 
-        stats_df = stats_df[columns_to_show].copy()
+        stats_df = stats_df.reindex(columns=columns_to_show, copy=False)
         stats_df.index.name = 'Признак'
 
         # Дополнительная фильтрация по выбранным признакам (если передан список индексов)
         if selected_columns:
-            valid_names = [self.data.get_column_name(i) for i in selected_columns
-                           if 0 <= i < len(self.data.df.columns)]
-            stats_df = stats_df.loc[stats_df.index.isin(valid_names)]
+            all_names = self.data.df.columns.to_numpy()
+            selected = np.asarray(selected_columns, dtype=np.intp)
+            selected = selected[(selected >= 0) & (selected < all_names.size)]
+            stats_df = stats_df.loc[stats_df.index.intersection(pd.Index(all_names[selected]))]
 
         if stats_df.empty:
-            return "<h2 style='text-align:center;color:#c53030;'>Нет выбранных числовых признаков</h2>"
-
-        # Форматирование значений для отображения
-        display_df = stats_df.copy()
-        for col in display_df.columns:
-            if col in ['min', '5%', 'Q1', 'median', 'Q3', '95%', 'max', 'mean', 'std']:
-                display_df[col] = display_df[col].map(lambda x: f"{x:.3f}" if pd.notna(x) else "—")
-            elif col in ['CV_percent', 'below_lod_percent', 'repeating_min_percent', 'zero_percent', 'nan_percent']:
-                display_df[col] = display_df[col].map(lambda x: f"{x:.1f}" if pd.notna(x) else "—")
-            elif col == 'variance':
-                display_df[col] = display_df[col].map(lambda x: f"{x:.6f}" if pd.notna(x) else "—")
-            elif col == 'J':
-                display_df[col] = display_df[col].map(lambda x: f"{x:.3f}" if pd.notna(x) else "—")
-            else:
-                display_df[col] = display_df[col].astype(str).replace('nan', '—')
+            yield "<h2 style='text-align:center;color:#c53030;'>Нет выбранных числовых признаков</h2>"
+            return
+
+        # Форматирование значений для отображения — одним проходом на группу столбцов с общей точностью
+        display_columns = {}
+        for fmt, group in STATS_VALUE_FORMATS:
+            cols = [col for col in stats_df.columns if col in group]
+            if not cols:
+                continue
+            values = stats_df[cols].to_numpy(dtype=float)
+            missing = np.isnan(values)
+            text = np.char.mod(fmt, np.where(missing, 0.0, values))
+            text[missing] = "—"
+            display_columns.update(zip(cols, text.T))
+        for col in stats_df.columns:
+            if col not in display_columns:
+                display_columns[col] = stats_df[col].astype(str).replace('nan', '—').to_numpy()
+        # Строки таблицы — кортежи готовых строк, без промежуточного DataFrame
+        rows = list(zip(*(display_columns[col] for col in stats_df.columns)))
 
         # ────────────────────────────────────────────────────────────────
         # HTML-отчёт
@@ -1525,54 +1588,40 @@ class MainWindow(QMainWindow):
             "<body>",
             "<div class='container'>",
             f"<h1>Статистический отчёт по признакам</h1>",
-            f"<p class='subtitle'>Файл: <b>{Path(self.data.filename).name}</b> | "
+            f"<p class='subtitle'>Файл: <b>{self.data.filename_base}</b> | "
             f"Записей: <b>{self.data.get_count_record():,}</b> | "
             f"Признаков: <b>{len(stats_df)}</b></p>",
             "<hr>",
         ]
 
         ROWS_PER_TABLE = 250
-        chunks = [display_df.iloc[i:i+ROWS_PER_TABLE] for i in range(0, len(display_df), ROWS_PER_TABLE)]
-
-        for idx, chunk in enumerate(chunks, 1):
+        chunks = [(i, min(i + ROWS_PER_TABLE, len(rows))) for i in range(0, len(rows), ROWS_PER_TABLE)]
+
+        # Строка заголовков одна на все таблицы, ячейки с именами признаков — по одной на признак
+        header_row = ("<tr><th class='row-header'>Признак</th>" +
+                      "".join(f"<th{STATS_COL_CLASS.get(col, '')}>{STATS_TITLES.get(col, col)}</th>"
+                              for col in stats_df.columns) +
+                      "</tr>")
+        row_headers = [f"<td class='row-header'>{html.escape(str(feature))}</td>" for feature in stats_df.index]
+
+        # Шапка и каждая таблица отдаются сразу, а не копятся в lines до конца отчёта
+        yield "\n".join(lines)
+        for idx, (start, stop) in enumerate(chunks, 1):
            # lines.append("<div class='table-wrapper'>")
-            lines.append("<table>")
-            
-            # Заголовки
-            lines.append("<tr>")
-            lines.append("<th class='row-header'>Признак</th>")
-            for col in chunk.columns:
-                title_map = {
-                    'repeating_min_percent': 'Мин. повт., %',
-                    'below_lod_percent'    : '≤LOD, %',
-                    'zero_percent'         : 'Нули, %',
-                    'CV_percent'           : 'CV, %',
-                    'nan_percent'          : 'NaN, %',
-                    'unique_count'         : 'Уник.',
-                    'variance'             : 'Var',
-                    'J'                    : 'J (информ.)'
-                }
-                display_name = title_map.get(col, col)
-                cls = ""
-                if col in ['5%', 'Q1', 'Q3', '95%']: cls = " class='percentile'"
-                if col == 'below_lod_percent':       cls = " class='lod-col'"
-                if col == 'CV_percent':              cls = " class='cv-col'"
-                if col == 'J':                       cls = " class='j-col'"
-                lines.append(f"<th{cls}>{display_name}</th>")
-            lines.append("</tr>")
-
-            # Данные
-            for feature, row in chunk.iterrows():
-                lines.append("<tr>")
-                lines.append(f"<td class='row-header'>{feature}</td>")
-                for val_str in row:
-                    lines.append(f"<td>{val_str}</td>")
-                lines.append("</tr>")
+            lines = ["<table>"]
             
+            # Заголовки и данные — по одной строке на <tr>
+            lines.append(header_row)
+            lines.extend(
+                "<tr>{}{}</tr>".format(row_headers[i], "".join(f"<td>{v}</td>" for v in rows[i]))
+                for i in range(start, stop)
+            )
+
             lines.append("</table>")
             if len(chunks) > 1:
                 lines.append(f"<p style='text-align:right; color:#64748b; font-size:0.9em;'>Таблица {idx} из {len(chunks)}</p>")
             #lines.append("</div>")
+            yield "\n" + "\n".join(lines)
 
         # ────────────────────────────────────────────────────────────────
         # Легенда — только включённые пункты
@@ -1610,6 +1659,7 @@ class MainWindow(QMainWindow):
                                 "    · <strong>J ≈ 0.0</strong> — равномерное распределение по всем 6 интервалам → максимальная гетерогенность<br>"
                                 "    · Рекомендуемый порог однородности: <strong>J ≥ 0.65</strong></li>")
 
+        lines = []
         if legend_lines:
             lines.extend([
                 "<hr>",
@@ -1624,10 +1674,11 @@ class MainWindow(QMainWindow):
             ])
 
         lines.append("</div></body></html>")
-        return "\n".join(lines)
+        yield "\n" + "\n".join(lines)
 
     def act_save_result(self):
-        if self.stat_corr.count() == 0:
+        n = self.stat_corr.count()
+        if n == 0:
             QMessageBox.information(self, "Нет данных", "Нет рассчитанных результатов для сохранения.")
             return
 
@@ -1649,28 +1700,24 @@ class MainWindow(QMainWindow):
             fname += '.txt'
 
         try:
-            with open(fname, "w", encoding="utf-8") as f:
-                        # 1. Первая строка — количество пар (а не количество признаков!)
-                        f.write(f"4\n")
-
-                        # 2. Заголовок таблицы
-                        f.write("n\tname\tR\tRR\n")
+            # Значения всех пар форматируются массивами, с учётом возможных NaN
+            r_values = np.asarray(self.stat_corr.corr, dtype=float)
+            rr_values = np.asarray(self.stat_corr.rr, dtype=float)
+            r_missing, rr_missing = np.isnan(r_values), np.isnan(rr_values)
+            r_strs = np.where(r_missing, "—", np.char.mod("%.3f", np.where(r_missing, 0.0, r_values)))
+            rr_strs = np.where(rr_missing, "—", np.char.mod("%.3f", np.where(rr_missing, 0.0, rr_values)))
 
-                        # 3. Данные по всем парам
-                        for i in range(self.stat_corr.count()):
-                            pair_name = self.stat_corr.get_pair_name(i)
-                            r_value   = self.stat_corr.get_corr(i)
-                            rr_value  = self.stat_corr.get_rr(i)
-
-                            # Порядковый номер начиная с 1
-                            num = i + 1
+            with open(fname, "w", encoding="utf-8") as f:
+                # 1. Первая строка — количество пар (а не количество признаков!)
+                f.write(f"{n}\n")
 
-                            # Форматирование значений с учётом возможных NaN
-                            r_str  = f"{r_value:.3f}"  if not np.isnan(r_value)  else "—"
-                            rr_str = f"{rr_value:.3f}" if not np.isnan(rr_value) else "—"
+                # 2. Заголовок таблицы
+                f.write("n\tname\tR\tRR\n")
 
-                            line = f"{num}\t{pair_name}\t{r_str}\t{rr_str}"
-                            f.write(line + "\n")
+                # 3. Данные по всем парам (порядковый номер начиная с 1)
+                f.writelines(f"{num}\t{pair_name}\t{r_str}\t{rr_str}\n"
+                             for num, pair_name, r_str, rr_str
+                             in zip(range(1, n + 1), self.stat_corr.pair_names, r_strs, rr_strs))
 
             QMessageBox.information(self, "Сохранено", f"Результаты сохранены в файл:\n{fname}")
 
@@ -48,6 +48,7 @@ class TStatCorr:
             'rr': TExtendedStat()
         }
         self.feature_stats = []
+        self._pair_cols = None  # (col1, col2) пар как numpy-массивы, из add_all_pairs
 
     def initialize(self, column_names):
         self.clear()
@@ -63,6 +64,7 @@ class TStatCorr:
         self.reserve1 = []
         self.reserve2 = []
         self.feature_stats = []
+        self._pair_cols = None
         self.all_pairs_stat = {
             'corr': TExtendedStat(),
             'dist10': TExtendedStat(),
@@ -80,6 +82,7 @@ class TStatCorr:
         if idx >= 0:
             return idx
         # Добавляем
+        self._pair_cols = None
         idx = len(self.pairs)
         self.pairs.append(p)
         self.pair_names.append(self.generate_pair_name(p.col1, p.col2))
@@ -90,6 +93,23 @@ class TStatCorr:
         self.reserve2.append(0.0)
         return idx
 
+    def add_all_pairs(self):
+        """
+        Создаёт сразу все пары (i < j) признаков column_names — в том же порядке,
+        что двойной цикл add_or_get_pair(i, j), но без поиска каждой пары.
+        Прежние пары и значения сбрасываются.
+        """
+        self._pair_cols = np.triu_indices(len(self.column_names), k=1)
+        cols1, cols2 = self._pair_cols[0].tolist(), self._pair_cols[1].tolist()
+        n = len(cols1)
+        self.pairs = [TColumnPair(a, b) for a, b in zip(cols1, cols2)]
+        self.pair_names = [self.generate_pair_name(a, b) for a, b in zip(cols1, cols2)]
+        self.corr = [0.0] * n
+        self.dist10 = [0.0] * n
+        self.rr = [0.0] * n
+        self.reserve1 = [0.0] * n
+        self.reserve2 = [0.0] * n
+
     def find_pair_index(self, col1, col2):
         for i, p in enumerate(self.pairs):
             if p.col1 == col1 and p.col2 == col2:
@@ -113,6 +133,17 @@ class TStatCorr:
         if 0 <= index < len(self.rr):
             self.rr[index] = value
 
+    def set_pairs_values(self, corr=None, dist10=None, rr=None):
+        """
+        Записывает значения сразу для всех пар (массивы длины count() в порядке пар).
+        """
+        if corr is not None:
+            self.corr = list(np.asarray(corr, dtype=float))
+        if dist10 is not None:
+            self.dist10 = list(np.asarray(dist10, dtype=float))
+        if rr is not None:
+            self.rr = list(np.asarray(rr, dtype=float))
+
     def get_column_name(self, idx):
         return self.column_names[idx] if 0 <= idx < len(self.column_names) else ""
 
@@ -134,6 +165,19 @@ class TStatCorr:
     def get_pair_index(self, col1, col2):
         return self.find_pair_index(min(col1, col2), max(col1, col2))
 
+    def get_pairs_array(self):
+        """
+        Возвращает (col1, col2, corr) для всех пар одним набором numpy-массивов.
+        """
+        corr = np.asarray(self.corr, dtype=float)
+        if self._pair_cols is not None:
+            col1, col2 = self._pair_cols  # пары созданы add_all_pairs — индексы уже готовы
+            return col1.copy(), col2.copy(), corr
+        n = self.count()
+        col1 = np.fromiter((p.col1 for p in self.pairs), dtype=np.intp, count=n)
+        col2 = np.fromiter((p.col2 for p in self.pairs), dtype=np.intp, count=n)
+        return col1, col2, corr
+
     def update_all_statistics(self):
         n = self.count()
         if n == 0:
@@ -0,0 +1,78 @@
+# test_corr_calculations.py
+import warnings
+
+import numpy as np
+from scipy.stats import spearmanr
+
+from corr_calculations import calculate_all_correlations
+from stat_corr_types import TStatCorr
+
+
+def _calculate(X):
+    stat_corr = TStatCorr()
+    stat_corr.initialize([f"F{i}" for i in range(X.shape[1])])
+    stat_corr.add_all_pairs()
+    calculate_all_correlations(stat_corr, X)
+    return stat_corr
+
+
+def _reference_corr(X):
+    """R поштучным spearmanr — как исходный расчёт по парам"""
+    num_features = X.shape[1]
+    corr = np.full((num_features, num_features), np.nan)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')  # постоянные векторы — NaN с предупреждением scipy
+        for a in range(num_features):
+            for b in range(a + 1, num_features):
+                corr[a, b] = corr[b, a] = spearmanr(X[:, a], X[:, b], nan_policy='omit')[0]
+    return corr
+
+
+def _reference_rr(corr):
+    """RR поштучным spearmanr между строками R без элементов пары"""
+    num_features = corr.shape[0]
+    rr = np.zeros((num_features, num_features))
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        for a in range(num_features):
+            for b in range(a + 1, num_features):
+                others = [c for c in range(num_features) if c != a and c != b]
+                if len(others) >= 2:
+                    rr[a, b] = rr[b, a] = spearmanr(corr[a, others], corr[b, others])[0]
+    return rr
+
+
+def _assert_matches_spearmanr(X):
+    stat_corr = _calculate(X)
+    cols1, cols2, values = stat_corr.get_pairs_array()
+    np.testing.assert_allclose(values, _reference_corr(X)[cols1, cols2], rtol=0, atol=1e-12, equal_nan=True)
+
+    # RR сверяется по рассчитанной R: расхождение R с spearmanr в последнем бите
+    # разрывает точные связки среди R, и ранги (а с ними RR) меняются скачком
+    corr = np.full((X.shape[1], X.shape[1]), np.nan)
+    corr[cols1, cols2] = corr[cols2, cols1] = values
+    np.testing.assert_allclose(stat_corr.rr, _reference_rr(corr)[cols1, cols2], rtol=0, atol=1e-12, equal_nan=True)
+
+
+def test_matches_spearmanr_without_ties():
+    # Без связок и пропусков — знаменатель n(n²−1)/12 общий для всех пар
+    rng = np.random.default_rng(0)
+    _assert_matches_spearmanr(rng.normal(size=(200, 7)))
+
+
+def test_matches_spearmanr_with_ties_and_nan():
+    rng = np.random.default_rng(1)
+    X = np.round(rng.normal(size=(150, 8)) * 2)  # много связок
+    X[:, 3] = np.round(X[:, 0] + rng.normal(size=150))  # связки и в коррелирующем столбце
+    X[:, 6] = X[:, 1]  # одинаковые столбцы — связки и среди самих R (поправка −0.5 в rr_matrix)
+    X[rng.random(150) < 0.1, 2] = np.nan
+    X[rng.random(150) < 0.2, 5] = np.nan
+    _assert_matches_spearmanr(X)
+
+
+def test_matches_spearmanr_with_constant_column():
+    rng = np.random.default_rng(2)
+    X = np.round(rng.normal(size=(120, 6)) * 3)
+    X[:, 4] = 1.5  # постоянный признак — R с ним NaN
+    X[rng.random(120) < 0.1, 1] = np.nan
+    _assert_matches_spearmanr(X)
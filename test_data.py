@@ -0,0 +1,98 @@
+# test_data.py
+import numpy as np
+import pandas as pd
+
+from data import TData, _parse_data_text
+
+
+def test_short_row_with_leading_delimiter_padded_at_end():
+    # Короткая строка с разделителем в начале — недостающие значения NaN в конце, как в исходном построчном разборе
+    df = _parse_data_text(" 1 2\n3 4 5\n", ['a', 'b', 'c'])
+    np.testing.assert_array_equal(df.to_numpy(), [[1.0, 2.0, np.nan], [3.0, 4.0, 5.0]])
+
+
+def test_short_row_with_leading_tab_padded_at_end():
+    df = _parse_data_text("\t1\t2\n3\t4\t5\n", ['a', 'b', 'c'])
+    np.testing.assert_array_equal(df.to_numpy(), [[1.0, 2.0, np.nan], [3.0, 4.0, 5.0]])
+
+
+def test_load_file_short_row_with_leading_delimiter(tmp_path):
+    fname = tmp_path / "sample.txt"
+    fname.write_text("3\nA B C\n 1 2\n3 4 5\n", encoding='utf-8')
+
+    data = TData()
+    assert data.load_file(str(fname))
+    np.testing.assert_array_equal(data.df.to_numpy(), [[1.0, 2.0, np.nan], [3.0, 4.0, 5.0]])
+
+
+def test_rows_longer_than_header_not_shifted_right():
+    # Безымянный лишний столбец в конце не сдвигает данные: A — первый столбец файла
+    df = _parse_data_text("1 2 3 4\n5 6 7 8\n", ['A', 'B', 'C'])
+    assert list(df.columns) == ['A', 'B', 'C']
+    np.testing.assert_array_equal(df.to_numpy(), [[1.0, 2.0, 3.0], [5.0, 6.0, 7.0]])
+
+
+def test_header_trimmed_to_data_width():
+    # Названий больше, чем значений в строках, — лишние названия отбрасываются, а не дают столбцы из NaN
+    df = _parse_data_text("1 2 3\n4 5 6\n", ['A', 'B', 'C', 'D'])
+    assert list(df.columns) == ['A', 'B', 'C']
+    np.testing.assert_array_equal(df.to_numpy(), [[1.0, 2.0, 3.0], [4.0, 5.0, 6.0]])
+
+
+def test_long_first_and_later_rows_handled_alike():
+    # Лишние значения отбрасываются одинаково в первой и в последующих строках
+    first_long = _parse_data_text("1 2 3 9\n4 5 6\n", ['A', 'B', 'C'])
+    later_long = _parse_data_text("1 2 3\n4 5 6 9\n", ['A', 'B', 'C'])
+    np.testing.assert_array_equal(first_long.to_numpy(), [[1.0, 2.0, 3.0], [4.0, 5.0, 6.0]])
+    np.testing.assert_array_equal(later_long.to_numpy(), [[1.0, 2.0, 3.0], [4.0, 5.0, 6.0]])
+
+
+def test_feather_cache_ignored_after_parser_version_change(tmp_path, monkeypatch):
+    import data as data_module
+
+    fname = tmp_path / "sample.txt"
+    fname.write_text("A B\n1 2\n3 4\n", encoding='utf-8')
+    assert TData().load_file(str(fname))  # пишет кэш sample.txt.feather
+
+    calls = []
+    parse = data_module._parse_data_text
+    monkeypatch.setattr(data_module, '_parse_data_text', lambda *args: calls.append(args) or parse(*args))
+
+    assert TData().load_file(str(fname))
+    assert not calls  # тот же файл и та же версия — из кэша
+
+    # Кэш другой версии разбора не читается — файл разбирается заново
+    monkeypatch.setattr(data_module, '_CACHE_VERSION', data_module._CACHE_VERSION + 1)
+    data = TData()
+    assert data.load_file(str(fname))
+    assert len(calls) == 1
+    np.testing.assert_array_equal(data.df.to_numpy(), [[1.0, 2.0], [3.0, 4.0]])
+
+
+def test_full_statistics_matches_pandas():
+    # Однопроходный расчёт совпадает с describe/skew/kurtosis/nunique pandas
+    rng = np.random.default_rng(3)
+    values = np.round(rng.lognormal(size=(200, 5)), 2)  # связки после округления
+    values[rng.random(200) < 0.3, 1] = 0.01             # значения ниже LOD (≤ 0.03)
+    values[rng.random(200) < 0.15, 2] = np.nan
+    values[:, 3] = 0.5                                   # постоянный признак
+    values[:7, 4] = np.nan
+    df = pd.DataFrame(values, columns=['A', 'B', 'C', 'D', 'E'])
+
+    data = TData()
+    data.df = df
+    stats = data.get_full_statistics()
+
+    # Округление и названия — как в get_full_statistics
+    describe = (df.describe(percentiles=[.05, .25, .5, .75, .95]).T
+                .round({'mean': 3, 'std': 3, 'min': 3, 'max': 3, '50%': 3})
+                .rename(columns={'25%': 'Q1', '50%': 'median', '75%': 'Q3'}))
+    for column in describe.columns:
+        np.testing.assert_allclose(stats[column], describe[column], rtol=1e-12, atol=1e-12, err_msg=column)
+    np.testing.assert_allclose(stats['skew'], df.skew().round(3), rtol=0, atol=1e-12)
+    np.testing.assert_allclose(stats['kurtosis'], df.kurtosis().round(3), rtol=0, atol=1e-12)
+    np.testing.assert_allclose(stats['variance'], df.var().round(6), rtol=0, atol=1e-12)
+    np.testing.assert_array_equal(stats['unique_count'], df.nunique())
+    np.testing.assert_allclose(stats['nan_percent'], (df.isna().mean() * 100).round(2), rtol=0, atol=1e-12)
+    np.testing.assert_allclose(stats['below_lod_percent'], ((df <= 0.03) | df.isna()).mean().mul(100).round(1),
+                               rtol=0, atol=1e-12)